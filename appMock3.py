@@ -1,132 +1,17 @@
-import os
-import subprocess
 import tempfile
-import requests
 from pathlib import Path
 
 import streamlit as st
-from bs4 import BeautifulSoup
-
-# ============================
-# CẤU HÌNH
-# ============================
-
-OLLAMA_URL = "http://14.241.244.57:11434/api/chat"
-MODEL_NAME = "llama3.1:8b"
-
-os.environ["OMP_NUM_THREADS"] = "1"
-os.environ["MKL_NUM_THREADS"] = "1"
-os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
-
-
-# ============================
-# GỌI OLLAMA (TEXT ONLY)
-# ============================
-
-def chat_with_ollama(context: str, question: str) -> str:
-    payload = {
-        "model": MODEL_NAME,
-        "messages": [
-            {
-                "role": "system",
-                "content": (
-                    "You are an assistant that answers questions strictly "
-                    "based on the following document content:\n\n"
-                    f"{context}"
-                )
-            },
-            {
-                "role": "user",
-                "content": question
-            }
-        ],
-        "stream": False
-    }
-
-    r = requests.post(OLLAMA_URL, json=payload, timeout=300)
-    r.raise_for_status()
-    return r.json()["message"]["content"]
-
-
-# ============================
-# CHẠY CHANDRA CLI
-# ============================
-
-def run_chandra_cli(input_file: Path, output_dir: Path):
-    cmd = [
-        "chandra",
-        str(input_file),
-        str(output_dir),
-        "--method",
-        "hf"
-    ]
-
-    result = subprocess.run(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
-    )
-
-    if result.returncode != 0:
-        raise RuntimeError(result.stderr)
-
-
-# ============================
-# ĐỌC OCR TEXT & HTML
-# ============================
-
-def read_ocr_text_and_tables(output_dir: Path):
-    text_blocks = []
-    html_tables = []
-
-    for file in sorted(output_dir.glob("**/*")):
-        if file.suffix.lower() in [".md", ".txt"]:
-            text_blocks.append(
-                file.read_text(encoding="utf-8", errors="ignore")
-            )
-
-        if file.suffix.lower() in [".html", ".htm"]:
-            html = file.read_text(encoding="utf-8", errors="ignore")
-            if "<table" in html.lower():
-                html_tables.append(html)
-
-    return "\n\n".join(text_blocks), html_tables
-
-
-# ============================
-# HTML TABLE → TEXT
-# ============================
-
-def table_html_to_text(html: str) -> str:
-    soup = BeautifulSoup(html, "html.parser")
-
-    lines = []
-    for row in soup.find_all("tr"):
-        cells = row.find_all(["th", "td"])
-        values = [c.get_text(" ", strip=True) for c in cells]
-        if any(values):
-            lines.append(" | ".join(values))
-
-    return "\n".join(lines)
-
-
-# ============================
-# ĐỌC ẢNH OCR
-# ============================
-
-def read_ocr_images(output_dir: Path):
-    images = []
-    for file in sorted(output_dir.glob("**/*")):
-        if file.suffix.lower() in {".webp", ".png", ".jpg", ".jpeg"}:
-            images.append(
-                {
-                    "name": file.name,
-                    "bytes": file.read_bytes()
-                }
-            )
-    return images
 
+from pdf_preview import upload_file
+from pipeline import (
+    chat_with_ollama,
+    read_ocr_images,
+    read_ocr_text_and_tables,
+    run_ocr,
+    spool_upload,
+    table_html_to_text,
+)
 
 # ============================
 # STREAMLIT UI
@@ -177,7 +62,7 @@ with left_col:
     upload_col, btn_col = st.columns([2.6, 1])
 
     with upload_col:
-        uploaded_file = st.file_uploader(
+        uploaded_file = upload_file(
             "Upload",
             type=["pdf", "jpg", "jpeg", "png", "webp"],
             label_visibility="collapsed"
@@ -202,12 +87,12 @@ with left_col:
             input_file = tmp / f"input{suffix}"
             output_dir = tmp / "ocr_output"
 
-            input_file.write_bytes(uploaded_file.read())
+            spool_upload(uploaded_file, input_file)
             output_dir.mkdir(exist_ok=True)
 
             with st.spinner("OCR đang chạy..."):
                 try:
-                    run_chandra_cli(input_file, output_dir)
+                    run_ocr(input_file, output_dir)
 
                     text, tables = read_ocr_text_and_tables(output_dir)
 
@@ -257,7 +142,7 @@ with right_col:
             ):
                 with cols[i % 3]:
                     st.image(
-                        img["bytes"],
+                        img["thumb"],
                         caption=img["name"],
                         use_container_width=True
                     )
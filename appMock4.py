@@ -1,23 +1,23 @@
-import os
-import subprocess
 import tempfile
-import requests
 from pathlib import Path
 
 import streamlit as st
-from bs4 import BeautifulSoup
+
+from assets import load_css
+from pdf_preview import upload_file
+from pipeline import (
+    chat_with_ollama,
+    read_ocr_images,
+    read_ocr_text_and_tables,
+    run_ocr,
+    spool_upload,
+    table_html_to_text,
+)
 
 # ============================
 # CẤU HÌNH
 # ============================
 
-OLLAMA_URL = "http://14.241.244.57:11434/api/chat"
-MODEL_NAME = "llama3.1:8b"
-
-os.environ["OMP_NUM_THREADS"] = "1"
-os.environ["MKL_NUM_THREADS"] = "1"
-os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
-
 MAIN_PANEL_HEIGHT = 680
 
 
@@ -25,154 +25,7 @@ MAIN_PANEL_HEIGHT = 680
 # CSS UI TÙY CHỈNH
 # ============================
 
-st.markdown("""
-<style>
-
-/* Thu nhỏ uploader */
-section[data-testid="stFileUploader"] {
-    padding: 0.2rem !important;
-}
-
-section[data-testid="stFileUploader"] > div {
-    padding: 0.2rem !important;
-}
-
-/* Thu nhỏ button */
-div[data-testid="stButton"] button {
-    padding: 0.25rem 0.6rem !important;
-    font-size: 0.8rem !important;
-}
-
-/* -------------------- */
-/* OCR RESULT: BỎ VIỀN */
-/* -------------------- */
-
-.ocr-panel div[data-testid="stVerticalBlock"] {
-    border: none !important;
-    box-shadow: none !important;
-    background: transparent !important;
-}
-
-/* -------------------- */
-/* CHAT PANEL: GIỮ KHUNG */
-/* -------------------- */
-
-.chat-panel {
-    border: 1px solid #ddd;
-    border-radius: 10px;
-    padding: 12px;
-    background: white;
-}
-
-/* vùng scroll cho chat */
-.chat-scroll {
-    height: 520px;
-    overflow-y: auto;
-}
-
-</style>
-""", unsafe_allow_html=True)
-
-
-# ============================
-# GỌI OLLAMA
-# ============================
-
-def chat_with_ollama(context: str, question: str) -> str:
-    payload = {
-        "model": MODEL_NAME,
-        "messages": [
-            {
-                "role": "system",
-                "content": (
-                    "You are an assistant that answers questions strictly "
-                    "based on the following document content:\n\n"
-                    f"{context}"
-                )
-            },
-            {
-                "role": "user",
-                "content": question
-            }
-        ],
-        "stream": False
-    }
-
-    r = requests.post(OLLAMA_URL, json=payload, timeout=300)
-    r.raise_for_status()
-    return r.json()["message"]["content"]
-
-
-# ============================
-# CHẠY CHANDRA
-# ============================
-
-def run_chandra_cli(input_file: Path, output_dir: Path):
-    cmd = [
-        "chandra",
-        str(input_file),
-        str(output_dir),
-        "--method",
-        "hf"
-    ]
-
-    result = subprocess.run(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
-    )
-
-    if result.returncode != 0:
-        raise RuntimeError(result.stderr)
-
-
-# ============================
-# ĐỌC OCR
-# ============================
-
-def read_ocr_text_and_tables(output_dir: Path):
-    text_blocks = []
-    html_tables = []
-
-    for file in sorted(output_dir.glob("**/*")):
-        if file.suffix.lower() in [".md", ".txt"]:
-            text_blocks.append(
-                file.read_text(encoding="utf-8", errors="ignore")
-            )
-
-        if file.suffix.lower() in [".html", ".htm"]:
-            html = file.read_text(encoding="utf-8", errors="ignore")
-            if "<table" in html.lower():
-                html_tables.append(html)
-
-    return "\n\n".join(text_blocks), html_tables
-
-
-def table_html_to_text(html: str) -> str:
-    soup = BeautifulSoup(html, "html.parser")
-
-    lines = []
-    for row in soup.find_all("tr"):
-        cells = row.find_all(["th", "td"])
-        values = [c.get_text(" ", strip=True) for c in cells]
-        if any(values):
-            lines.append(" | ".join(values))
-
-    return "\n".join(lines)
-
-
-def read_ocr_images(output_dir: Path):
-    images = []
-    for file in sorted(output_dir.glob("**/*")):
-        if file.suffix.lower() in {".webp", ".png", ".jpg", ".jpeg"}:
-            images.append(
-                {
-                    "name": file.name,
-                    "bytes": file.read_bytes()
-                }
-            )
-    return images
+st.markdown(load_css("appMock4"), unsafe_allow_html=True)
 
 
 # ============================
@@ -224,7 +77,7 @@ with st.container():
         upload_col, btn_col = st.columns([2.6, 1])
 
         with upload_col:
-            uploaded_file = st.file_uploader(
+            uploaded_file = upload_file(
                 "Upload",
                 type=["pdf", "jpg", "jpeg", "png", "webp"],
                 label_visibility="collapsed"
@@ -251,12 +104,12 @@ with st.container():
                     input_file = tmp / f"input{suffix}"
                     output_dir = tmp / "ocr_output"
 
-                    input_file.write_bytes(uploaded_file.read())
+                    spool_upload(uploaded_file, input_file)
                     output_dir.mkdir(exist_ok=True)
 
                     with st.spinner("OCR đang chạy..."):
                         try:
-                            run_chandra_cli(input_file, output_dir)
+                            run_ocr(input_file, output_dir)
 
                             text, tables = read_ocr_text_and_tables(output_dir)
 
@@ -309,7 +162,7 @@ with st.container():
                     ):
                         with cols[i % 3]:
                             st.image(
-                                img["bytes"],
+                                img["thumb"],
                                 caption=img["name"],
                                 use_container_width=True
                             )
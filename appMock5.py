@@ -1,19 +1,21 @@
-import os
-import subprocess
 import tempfile
-import requests
 from pathlib import Path
 
 import streamlit as st
-from bs4 import BeautifulSoup
+
+from assets import load_css
+from pdf_preview import upload_file
+from pipeline import (
+    chat_with_ollama,
+    read_ocr_text_and_tables,
+    run_ocr,
+    spool_upload,
+)
 
 # ============================
 # CONFIG
 # ============================
 
-OLLAMA_URL = "http://14.241.244.57:11434/api/chat"
-MODEL_NAME = "llama3.1:8b"
-
 MAIN_COL_HEIGHT = 92  # % viewport height
 
 # ============================
@@ -22,126 +24,10 @@ MAIN_COL_HEIGHT = 92  # % viewport height
 
 st.set_page_config(layout="wide")
 
-st.markdown(f"""
-<style>
-
-/* ===== COLUMN HEIGHT ===== */
-
-.main-col {{
-    height: {MAIN_COL_HEIGHT}vh;
-    display: flex;
-    flex-direction: column;
-}}
-
-.fixed-panel {{
-    flex: 1;
-    overflow-y: auto;
-    border: 1px solid #ddd;
-    border-radius: 10px;
-    padding: 12px;
-}}
-
-.no-border {{
-    border: none !important;
-    box-shadow: none !important;
-}}
-
-/* ===== BUTTON & UPLOAD COMPACT ===== */
-
-section[data-testid="stFileUploader"] {{
-    padding: 0.2rem !important;
-}}
-
-div[data-testid="stButton"] button {{
-    padding: 0.3rem 0.7rem !important;
-    font-size: 0.85rem !important;
-}}
-
-.app-title {{
-    font-size: 1.6rem;
-    font-weight: 700;
-    padding-bottom: 0.5rem;
-}}
-
-</style>
-""", unsafe_allow_html=True)
-
-
-# ============================
-# LLM
-# ============================
-
-def chat_with_ollama(context: str, question: str) -> str:
-    payload = {
-        "model": MODEL_NAME,
-        "messages": [
-            {
-                "role": "system",
-                "content": (
-                    "You are an assistant that answers strictly "
-                    "based on the following document:\n\n"
-                    f"{context}"
-                )
-            },
-            {
-                "role": "user",
-                "content": question
-            }
-        ],
-        "stream": False
-    }
-
-    r = requests.post(OLLAMA_URL, json=payload, timeout=300)
-    r.raise_for_status()
-    return r.json()["message"]["content"]
-
-
-# ============================
-# OCR CLI
-# ============================
-
-def run_chandra_cli(input_file: Path, output_dir: Path):
-    cmd = ["chandra", str(input_file), str(output_dir), "--method", "hf"]
-
-    result = subprocess.run(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
-    )
-
-    if result.returncode != 0:
-        raise RuntimeError(result.stderr)
-
-
-# ============================
-# READ OCR
-# ============================
-
-def read_ocr_text_and_tables(output_dir: Path):
-    text_blocks = []
-    html_tables = []
-
-    for file in output_dir.glob("**/*"):
-        if file.suffix.lower() in [".md", ".txt"]:
-            text_blocks.append(file.read_text(errors="ignore"))
-
-        if file.suffix.lower() in [".html", ".htm"]:
-            html = file.read_text(errors="ignore")
-            if "<table" in html.lower():
-                html_tables.append(html)
-
-    return "\n\n".join(text_blocks), html_tables
-
-
-def table_html_to_text(html: str) -> str:
-    soup = BeautifulSoup(html, "html.parser")
-    rows = []
-    for r in soup.find_all("tr"):
-        cells = [c.get_text(" ", strip=True) for c in r.find_all(["td", "th"])]
-        if cells:
-            rows.append(" | ".join(cells))
-    return "\n".join(rows)
+st.markdown(
+    load_css("appMock5", MAIN_COL_HEIGHT=MAIN_COL_HEIGHT),
+    unsafe_allow_html=True,
+)
 
 
 # ============================
@@ -168,7 +54,7 @@ with col1:
 
     st.markdown('<div class="app-title">📄 OCR + LLM Dashboard</div>', unsafe_allow_html=True)
 
-    uploaded_file = st.file_uploader(
+    uploaded_file = upload_file(
         "Upload",
         type=["pdf", "png", "jpg", "jpeg", "webp"]
     )
@@ -263,13 +149,13 @@ if run_btn and uploaded_file:
         input_file = tmp / uploaded_file.name
         output_dir = tmp / "ocr"
 
-        input_file.write_bytes(uploaded_file.read())
+        spool_upload(uploaded_file, input_file)
         output_dir.mkdir()
 
         with st.spinner("OCR đang chạy..."):
 
             try:
-                run_chandra_cli(input_file, output_dir)
+                run_ocr(input_file, output_dir)
 
                 text, tables = read_ocr_text_and_tables(output_dir)
 
@@ -1,132 +1,19 @@
-import os
-import subprocess
-import tempfile
-import requests
-import base64
 from pathlib import Path
 
 import streamlit as st
-from bs4 import BeautifulSoup
 
-# ============================
-# CẤU HÌNH
-# ============================
-
-OLLAMA_URL = "http://14.241.244.57:11434/api/chat"
-MODEL_NAME = "llama3.1:8b"
-
-os.environ["OMP_NUM_THREADS"] = "1"
-os.environ["MKL_NUM_THREADS"] = "1"
-os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
-
-
-# ============================
-# GỌI OLLAMA (TEXT ONLY)
-# ============================
-
-def chat_with_ollama(context: str, question: str) -> str:
-    payload = {
-        "model": MODEL_NAME,
-        "messages": [
-            {
-                "role": "system",
-                "content": (
-                    "You are an assistant that answers questions strictly "
-                    "based on the following document content:\n\n"
-                    f"{context}"
-                )
-            },
-            {
-                "role": "user",
-                "content": question
-            }
-        ],
-        "stream": False
-    }
-
-    r = requests.post(OLLAMA_URL, json=payload, timeout=300)
-    r.raise_for_status()
-    return r.json()["message"]["content"]
-
-
-# ============================
-# CHẠY CHANDRA CLI
-# ============================
-
-def run_chandra_cli(input_file: Path, output_dir: Path):
-    cmd = [
-        "chandra",
-        str(input_file),
-        str(output_dir),
-        "--method",
-        "hf"
-    ]
-
-    result = subprocess.run(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
-    )
-
-    if result.returncode != 0:
-        raise RuntimeError(result.stderr)
-
-
-# ============================
-# ĐỌC OCR TEXT & HTML
-# ============================
-
-def read_ocr_text_and_tables(output_dir: Path):
-    text_blocks = []
-    html_tables = []
-
-    for file in sorted(output_dir.glob("**/*")):
-        if file.suffix.lower() in [".md", ".txt"]:
-            text_blocks.append(
-                file.read_text(encoding="utf-8", errors="ignore")
-            )
-
-        if file.suffix.lower() in [".html", ".htm"]:
-            html = file.read_text(encoding="utf-8", errors="ignore")
-            if "<table" in html.lower():
-                html_tables.append(html)
-
-    return "\n\n".join(text_blocks), html_tables
-
-
-# ============================
-# HTML TABLE → TEXT
-# ============================
-
-def table_html_to_text(html: str) -> str:
-    soup = BeautifulSoup(html, "html.parser")
-
-    lines = []
-    for row in soup.find_all("tr"):
-        cells = row.find_all(["th", "td"])
-        values = [c.get_text(" ", strip=True) for c in cells]
-        if any(values):
-            lines.append(" | ".join(values))
-
-    return "\n".join(lines)
-
-
-# ============================
-# ĐỌC ẢNH OCR
-# ============================
-
-def read_ocr_images(output_dir: Path):
-    images = []
-    for file in sorted(output_dir.glob("**/*")):
-        if file.suffix.lower() in {".webp", ".png", ".jpg", ".jpeg"}:
-            images.append(
-                {
-                    "name": file.name,
-                    "bytes": file.read_bytes()
-                }
-            )
-    return images
+from ocr_viewer import render_ocr_viewer
+from pdf_preview import render_pdf_preview, spooled_upload, upload_file
+from profiling import profile_rerun
+from pipeline import (
+    EMPTY_DOCUMENT,
+    OcrQueueFull,
+    answer_corpus_question,
+    answer_question,
+    format_sources,
+    open_document,
+    start_metrics_server,
+)
 
 
 # ============================
@@ -138,202 +25,228 @@ st.set_page_config(
     layout="wide"
 )
 
-# ============================
-# SESSION STATE
-# ============================
+# /metrics (Prometheus) trên cổng METRICS_PORT, mở 1 lần cho cả process
+start_metrics_server()
 
-for k, v in {
-    "ocr_text": "",
-    "ocr_tables_html": [],
-    "ocr_images": [],
-    "uploaded_preview": None,
-    "chat_answer": "",
-}.items():
-    if k not in st.session_state:
-        st.session_state[k] = v
+
+def current_doc() -> dict:
+    # Kết quả OCR nằm trong cache dùng chung, session chỉ giữ handle
+    handle = st.session_state.doc_handle
+    return handle.data if handle else EMPTY_DOCUMENT
 
 
 # ============================
-# LAYOUT CHÍNH - 3 CỘT
+# PANEL XEM TRƯỚC (CỘT 2)
 # ============================
+# Mỗi panel là 1 fragment: thao tác trong panel nào chỉ chạy lại panel đó,
+# không dựng lại preview / kết quả OCR của các panel khác.
+
+@st.fragment
+@profile_rerun("preview_panel")
+def preview_panel(uploaded_file):
+    st.markdown("#### 👁️ Xem trước tài liệu")
+    
+    if uploaded_file:
+        suffix = Path(uploaded_file.name).suffix.lower()
+        
+        if suffix == ".pdf":
+            render_pdf_preview(uploaded_file, height=600)
+        else:
+            st.image(uploaded_file, use_container_width=True)
+    else:
+        st.info("📁 Chưa có tài liệu nào được tải lên")
 
-col1, col2, col3 = st.columns([2, 4, 4])
 
 # ============================
-# CỘT 1 - ĐIỀU KHIỂN
+# PANEL KẾT QUẢ OCR VÀ CHAT (CỘT 3)
 # ============================
 
-with col1:
-    st.markdown("### 📄 OCR + Chat LLM")
-    st.markdown("<small>Chandra CLI • PDF / Image • Text-only LLM</small>", unsafe_allow_html=True)
+@st.fragment
+@profile_rerun("ocr_panel")
+def ocr_panel():
+    doc = current_doc()
+    
+    if doc["text"] or doc["tables_html"] or doc["images"]:
+        # Tạo container có thể scroll
+        ocr_container = st.container(height=550)
+        
+        with ocr_container:
+            render_ocr_viewer(
+                doc["pages"],
+                doc["tables_html"],
+                doc["images"]
+            )
+    else:
+        st.info("📋 Chưa có kết quả OCR")
+
+
+@st.fragment
+@profile_rerun("chat_panel")
+def chat_panel():
+    st.markdown("**💬 Trả lời:**")
     
-    st.markdown("---")
+    # Container có thể scroll cho câu trả lời
+    chat_container = st.container(height=350)
     
-    st.markdown("#### 📤 Tải tài liệu")
+    with chat_container:
+        if st.session_state.chat_answer:
+            st.markdown(st.session_state.chat_answer)
+        else:
+            st.info("🤖 Hãy đặt câu hỏi về tài liệu...")
     
-    uploaded_file = st.file_uploader(
-        "Chọn file",
-        type=["pdf", "jpg", "jpeg", "png", "webp"],
-        label_visibility="visible"
+    # Input câu hỏi
+    question = st.text_area(
+        "Câu hỏi về tài liệu:",
+        height=80,
+        placeholder="Ví dụ: Văn bản này ban hành ngày nào?",
+        key="question_input"
     )
     
-    run_btn = st.button("🚀 Chạy OCR", use_container_width=True, type="primary")
+    corpus_mode = st.toggle(
+        "📚 Hỏi trên toàn bộ kho tài liệu",
+        key="corpus_mode"
+    )
     
-    if uploaded_file:
-        st.success(f"✅ Đã tải: {uploaded_file.name}")
+    ask_btn = st.button("📨 Hỏi LLM", use_container_width=True, type="primary")
     
-    # Xử lý OCR
-    if run_btn and uploaded_file:
-        suffix = Path(uploaded_file.name).suffix.lower()
-        
-        with tempfile.TemporaryDirectory() as tmp:
-            tmp = Path(tmp)
-            
-            input_file = tmp / f"input{suffix}"
-            output_dir = tmp / "ocr_output"
-            
-            input_file.write_bytes(uploaded_file.read())
-            output_dir.mkdir(exist_ok=True)
-            
-            with st.spinner("OCR đang chạy..."):
+    doc = current_doc()
+    
+    if ask_btn and question and corpus_mode:
+        with st.spinner("🔎 Đang tìm trong kho tài liệu..."):
+            try:
+                answer, passages = answer_corpus_question(question)
+                if passages:
+                    answer += f"\n\n*Nguồn: {format_sources(passages)}*"
+                st.session_state.chat_answer = answer
+                st.rerun(scope="fragment")
+                
+            except Exception as e:
+                st.error("❌ LLM gặp lỗi")
+                st.exception(e)
+    
+    elif ask_btn and question:
+        if not doc["text"] and not doc["tables_html"]:
+            st.warning("⚠️ Vui lòng chạy OCR trước khi đặt câu hỏi!")
+        else:
+            with st.spinner("🤖 LLM đang suy nghĩ..."):
                 try:
-                    run_chandra_cli(input_file, output_dir)
-                    
-                    text, tables = read_ocr_text_and_tables(output_dir)
-                    
-                    st.session_state.ocr_text = text
-                    st.session_state.ocr_tables_html = tables
-                    st.session_state.ocr_images = read_ocr_images(output_dir)
-                    
-                    st.success("✅ OCR hoàn tất")
+                    # Câu hỏi số học trên bảng được trả lời ngay, không gọi LLM
+                    answer = answer_question(doc, question)
+                    st.session_state.chat_answer = answer
+                    st.rerun(scope="fragment")
                     
                 except Exception as e:
-                    st.error("❌ OCR lỗi")
+                    st.error("❌ LLM gặp lỗi")
                     st.exception(e)
 
 
-# ============================
-# CỘT 2 - HIỂN THỊ TÀI LIỆU
-# ============================
+def main():
+    # ============================
+    # SESSION STATE
+    # ============================
 
-with col2:
-    st.markdown("#### 👁️ Xem trước tài liệu")
-    
-    if uploaded_file:
-        suffix = Path(uploaded_file.name).suffix.lower()
-        
-        if suffix == ".pdf":
-            # Đọc bytes của PDF và hiển thị
-            uploaded_file.seek(0)  # Reset về đầu file
-            pdf_bytes = uploaded_file.read()
-            base64_pdf = base64.b64encode(pdf_bytes).decode('utf-8')
-            
-            # Tạo iframe để hiển thị PDF
-            pdf_display = f'''
-                <iframe 
-                    src="data:application/pdf;base64,{base64_pdf}" 
-                    width="100%" 
-                    height="600" 
-                    type="application/pdf"
-                    style="border: 1px solid #ddd; border-radius: 5px;">
-                </iframe>
-            '''
-            st.markdown(pdf_display, unsafe_allow_html=True)
-            
-            # Reset lại để không ảnh hưởng đến việc xử lý OCR
-            uploaded_file.seek(0)
-        else:
-            st.image(uploaded_file, use_container_width=True)
-    else:
-        st.info("📁 Chưa có tài liệu nào được tải lên")
+    for k, v in {
+        "doc_handle": None,
+        "uploaded_preview": None,
+        "chat_answer": "",
+    }.items():
+        if k not in st.session_state:
+            st.session_state[k] = v
 
+    # ============================
+    # LAYOUT CHÍNH - 3 CỘT
+    # ============================
 
-# ============================
-# CỘT 3 - KẾT QUẢ OCR VÀ CHAT
-# ============================
+    col1, col2, col3 = st.columns([2, 4, 4])
 
-with col3:
-    st.markdown("#### 🔍 Kết quả & Chat")
-    
-    tab_ocr, tab_chat = st.tabs(["📄 Kết quả OCR", "💬 Chat LLM"])
-    
-    # -------- TAB OCR --------
-    with tab_ocr:
-        if st.session_state.ocr_text or st.session_state.ocr_tables_html or st.session_state.ocr_images:
-            # Tạo container có thể scroll
-            ocr_container = st.container(height=550)
-            
-            with ocr_container:
-                if st.session_state.ocr_text:
-                    st.markdown("**📝 Văn bản:**")
-                    st.markdown(st.session_state.ocr_text)
-                    st.markdown("---")
-                
-                if st.session_state.ocr_tables_html:
-                    st.markdown("**📊 Bảng:**")
-                    for i, html in enumerate(st.session_state.ocr_tables_html, 1):
-                        st.markdown(f"*Bảng {i}:*")
-                        st.markdown(html, unsafe_allow_html=True)
-                        if i < len(st.session_state.ocr_tables_html):
-                            st.markdown("---")
-                
-                if st.session_state.ocr_images:
-                    st.markdown("**🖼️ Hình ảnh/Chữ ký:**")
-                    cols = st.columns(2)
-                    for i, img in enumerate(st.session_state.ocr_images):
-                        with cols[i % 2]:
-                            st.image(
-                                img["bytes"],
-                                caption=img["name"],
-                                use_container_width=True
-                            )
-        else:
-            st.info("📋 Chưa có kết quả OCR")
-    
-    # -------- TAB CHAT --------
-    with tab_chat:
-        st.markdown("**💬 Trả lời:**")
+    # ============================
+    # CỘT 1 - ĐIỀU KHIỂN
+    # ============================
+
+    with col1:
+        st.markdown("### 📄 OCR + Chat LLM")
+        st.markdown("<small>Chandra CLI • PDF / Image • Text-only LLM</small>", unsafe_allow_html=True)
         
-        # Container có thể scroll cho câu trả lời
-        chat_container = st.container(height=350)
+        st.markdown("---")
         
-        with chat_container:
-            if st.session_state.chat_answer:
-                st.markdown(st.session_state.chat_answer)
-            else:
-                st.info("🤖 Hãy đặt câu hỏi về tài liệu...")
+        st.markdown("#### 📤 Tải tài liệu")
         
-        # Input câu hỏi
-        question = st.text_area(
-            "Câu hỏi về tài liệu:",
-            height=80,
-            placeholder="Ví dụ: Văn bản này ban hành ngày nào?",
-            key="question_input"
+        uploaded_file = upload_file(
+            "Chọn file",
+            type=["pdf", "jpg", "jpeg", "png", "webp"],
+            label_visibility="visible"
         )
         
-        ask_btn = st.button("📨 Hỏi LLM", use_container_width=True, type="primary")
+        run_btn = st.button("🚀 Chạy OCR", use_container_width=True, type="primary")
         
-        if ask_btn and question:
-            if not st.session_state.ocr_text and not st.session_state.ocr_tables_html:
-                st.warning("⚠️ Vui lòng chạy OCR trước khi đặt câu hỏi!")
-            else:
-                with st.spinner("🤖 LLM đang suy nghĩ..."):
-                    table_text = "\n\n".join(
-                        table_html_to_text(t)
-                        for t in st.session_state.ocr_tables_html
-                    )
-                    
-                    llm_context = (
-                        st.session_state.ocr_text
-                        + "\n\n"
-                        + table_text
+        if uploaded_file:
+            st.success(f"✅ Đã tải: {uploaded_file.name}")
+        
+        # Xử lý OCR
+        if run_btn and uploaded_file:
+            doc_key, upload_path = spooled_upload(uploaded_file)
+            queue_status = st.empty()
+        
+            def show_queue_position(position):
+                if position:
+                    queue_status.info(f"⏳ Đang chờ OCR: vị trí {position} trong hàng đợi")
+                else:
+                    queue_status.empty()
+
+            def show_progress(done, total):
+                queue_status.progress(done / total, text=f"📄 OCR trang {done}/{total}")
+        
+            with st.spinner("OCR đang chạy..."):
+                try:
+                    # Tài liệu đã được session khác OCR -> dùng lại, không chạy lại
+                    handle = open_document(
+                        upload_path,
+                        uploaded_file.name,
+                        on_wait=show_queue_position,
+                        on_progress=show_progress,
+                        key=doc_key
                     )
-                    
-                    try:
-                        answer = chat_with_ollama(llm_context, question)
-                        st.session_state.chat_answer = answer
-                        st.rerun()
-                        
-                    except Exception as e:
-                        st.error("❌ LLM gặp lỗi")
-                        st.exception(e)
\ No newline at end of file
+                    queue_status.empty()
+                
+                    if st.session_state.doc_handle is not None:
+                        st.session_state.doc_handle.release()
+                    st.session_state.doc_handle = handle
+                
+                    st.success("✅ OCR hoàn tất")
+                
+                except OcrQueueFull:
+                    queue_status.empty()
+                    st.warning("⚠️ Hệ thống đang bận, vui lòng thử lại sau ít phút.")
+                
+                except Exception as e:
+                    st.error("❌ OCR lỗi")
+                    st.exception(e)
+
+    # ============================
+    # CỘT 2 - HIỂN THỊ TÀI LIỆU
+    # ============================
+
+    with col2:
+        preview_panel(uploaded_file)
+
+    # ============================
+    # CỘT 3 - KẾT QUẢ OCR VÀ CHAT
+    # ============================
+
+    with col3:
+        st.markdown("#### 🔍 Kết quả & Chat")
+        
+        tab_ocr, tab_chat = st.tabs(["📄 Kết quả OCR", "💬 Chat LLM"])
+        
+        # -------- TAB OCR --------
+        with tab_ocr:
+            ocr_panel()
+        
+        # -------- TAB CHAT --------
+        with tab_chat:
+            chat_panel()
+
+
+# Toàn bộ rerun chạy trong profile_rerun: bật bằng PROFILE_RERUNS=1 hoặc ?profile=1
+with profile_rerun("appMock8"):
+    main()
@@ -0,0 +1,25 @@
+import functools
+from pathlib import Path
+from string import Template
+
+# ============================
+# CSS TĨNH (ĐỌC 1 LẦN / PROCESS)
+# ============================
+#
+# CSS của từng app nằm trong static/<tên>.css, đọc và dựng chuỗi <style>
+# 1 lần cho cả process thay vì dựng lại ở mỗi lần rerun.
+
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+
+
+@functools.lru_cache(maxsize=None)
+def _render_css(name: str, values: tuple) -> str:
+    css = (STATIC_DIR / f"{name}.css").read_text(encoding="utf-8")
+    if values:
+        # Biến trong file CSS viết dạng ${TEN_BIEN}
+        css = Template(css).substitute(dict(values))
+    return f"<style>\n{css}</style>"
+
+
+def load_css(name: str, **values) -> str:
+    return _render_css(name, tuple(sorted(values.items())))
@@ -0,0 +1,170 @@
+import re
+
+import streamlit as st
+
+from pipeline.images import load_image
+
+# ============================
+# XEM KẾT QUẢ OCR THEO TRANG
+# ============================
+#
+# Chỉ gửi xuống trình duyệt phần đang xem (1 cửa sổ trang / bảng / ảnh),
+# thay vì toàn bộ văn bản mỗi lần script chạy lại.
+
+WINDOW_SIZES = [1, 3, 5]
+TABLES_PER_VIEW = 3
+IMAGES_PER_VIEW = 6
+
+
+def find_pages(pages, query: str) -> list:
+    q = query.strip().casefold()
+    if not q:
+        return []
+    return [i for i, page in enumerate(pages) if q in page.casefold()]
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def render_page(page: str, query: str = "") -> str:
+    # Cache theo (nội dung trang, từ khóa): rerun không phải xử lý lại
+    q = query.strip()
+    if not q:
+        return page
+    pattern = re.compile(re.escape(q), re.IGNORECASE)
+    return pattern.sub(lambda m: f"**{m.group(0)}**", page)
+
+
+def _pager(total: int, per_view: int, key: str) -> range:
+    n_views = max(1, (total + per_view - 1) // per_view)
+    state_key = f"{key}_view"
+    if state_key not in st.session_state or st.session_state[state_key] >= n_views:
+        st.session_state[state_key] = 0
+
+    prev_col, info_col, next_col = st.columns([1, 2, 1])
+    with prev_col:
+        if st.button("◀", key=f"{key}_prev", disabled=st.session_state[state_key] == 0,
+                     use_container_width=True):
+            st.session_state[state_key] -= 1
+    with next_col:
+        if st.button("▶", key=f"{key}_next",
+                     disabled=st.session_state[state_key] >= n_views - 1,
+                     use_container_width=True):
+            st.session_state[state_key] += 1
+    with info_col:
+        st.markdown(
+            f"<div style='text-align:center'>{st.session_state[state_key] + 1} / {n_views}</div>",
+            unsafe_allow_html=True
+        )
+
+    start = st.session_state[state_key] * per_view
+    return range(start, min(start + per_view, total))
+
+
+def _text_view(pages, key: str):
+    search_col, window_col = st.columns([3, 1])
+    with search_col:
+        query = st.text_input(
+            "Tìm trong văn bản",
+            key=f"{key}_query",
+            placeholder="🔎 Tìm trong văn bản...",
+            label_visibility="collapsed"
+        )
+    with window_col:
+        window = st.selectbox(
+            "Số trang",
+            WINDOW_SIZES,
+            key=f"{key}_window",
+            format_func=lambda n: f"{n} trang",
+            label_visibility="collapsed"
+        )
+
+    page_key = f"{key}_page"
+    if page_key not in st.session_state or st.session_state[page_key] > len(pages):
+        st.session_state[page_key] = 1
+
+    matches = find_pages(pages, query)
+    if query.strip():
+        if matches:
+            hit = st.selectbox(
+                f"Tìm thấy ở {len(matches)} trang",
+                matches,
+                format_func=lambda i: f"Trang {i + 1}",
+                key=f"{key}_hit"
+            )
+            # Chỉ nhảy trang khi chọn kết quả mới, vẫn cho phép lật trang tự do
+            if st.session_state.get(f"{key}_hit_last") != (query, hit):
+                st.session_state[f"{key}_hit_last"] = (query, hit)
+                st.session_state[page_key] = hit + 1
+        else:
+            st.caption("Không tìm thấy kết quả")
+
+    st.number_input(
+        f"Trang (tổng {len(pages)})",
+        min_value=1,
+        max_value=len(pages),
+        step=window,
+        key=page_key
+    )
+
+    start = st.session_state[page_key] - 1
+    for i in range(start, min(start + window, len(pages))):
+        st.caption(f"— Trang {i + 1} —")
+        st.markdown(render_page(pages[i], query))
+
+
+def _tables_view(tables_html, key: str):
+    for i in _pager(len(tables_html), TABLES_PER_VIEW, f"{key}_tables"):
+        st.markdown(f"*Bảng {i + 1}:*")
+        st.markdown(tables_html[i], unsafe_allow_html=True)
+
+
+def _images_view(images, key: str):
+    shown = _pager(len(images), IMAGES_PER_VIEW, f"{key}_images")
+    cols = st.columns(2)
+    for n, i in enumerate(shown):
+        with cols[n % 2]:
+            st.image(
+                images[i]["thumb"],
+                caption=images[i]["name"],
+                use_container_width=True
+            )
+
+    # Ảnh gốc chỉ tải khi người dùng chọn xem
+    full_idx = st.selectbox(
+        "🔍 Xem ảnh gốc",
+        options=range(len(images)),
+        index=None,
+        format_func=lambda i: images[i]["name"],
+        key=f"{key}_image_full"
+    )
+    if full_idx is not None:
+        st.image(
+            load_image(images[full_idx]),
+            caption=images[full_idx]["name"],
+            use_container_width=True
+        )
+
+
+def render_ocr_viewer(pages, tables_html, images, key: str = "ocr"):
+    sections = []
+    if pages:
+        sections.append(f"📝 Văn bản ({len(pages)})")
+    if tables_html:
+        sections.append(f"📊 Bảng ({len(tables_html)})")
+    if images:
+        sections.append(f"🖼️ Hình ảnh ({len(images)})")
+
+    section = st.radio(
+        "Mục",
+        sections,
+        horizontal=True,
+        key=f"{key}_section",
+        label_visibility="collapsed"
+    )
+
+    # Chỉ dựng phần đang chọn
+    if section.startswith("📝"):
+        _text_view(pages, key)
+    elif section.startswith("📊"):
+        _tables_view(tables_html, key)
+    else:
+        _images_view(images, key)
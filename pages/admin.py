@@ -0,0 +1,118 @@
+import hmac
+import os
+
+import streamlit as st
+
+from pipeline import admission, config, registry
+from pipeline.metrics import percentile, recent_durations
+
+try:
+    import psutil
+except ImportError:  # Không có psutil -> đọc /proc (Linux)
+    psutil = None
+
+# ============================
+# TRANG QUẢN TRỊ: HIỆU NĂNG
+# ============================
+#
+# Số liệu lấy từ vòng đệm trong process (pipeline.metrics.recent_events)
+# và trạng thái hàng đợi OCR / cache tài liệu, không truy vấn gì thêm.
+# Streamlit hiện trang này ở sidebar của mọi app trong thư mục -> chỉ hiển
+# thị số liệu khi URL có ?token= khớp ADMIN_TOKEN.
+
+REFRESH_SECONDS = 5
+WINDOWS = {"5 phút": 300, "15 phút": 900, "1 giờ": 3600, "Tất cả": None}
+
+LATENCY_GROUPS = {
+    "Chờ OCR (hàng đợi)": ["ocr_queue"],
+    "OCR (chandra)": ["run_chandra_cli"],
+    "Đọc output OCR": ["read_ocr_text_and_tables"],
+    "Dựng ngữ cảnh": ["build_llm_context"],
+    "Tìm đoạn (kho)": ["search_chunks"],
+    "LLM": ["chat_with_ollama", "stream_chat_with_ollama"],
+    "LLM - đoạn đầu tiên": ["stream_chat_with_ollama_first_chunk"],
+}
+
+
+def process_rss() -> int:
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def streamlit_sessions() -> int:
+    # API nội bộ của Streamlit, có thể đổi giữa các phiên bản -> lỗi thì bỏ qua
+    try:
+        from streamlit.runtime import Runtime
+
+        return Runtime.instance()._session_mgr.num_active_sessions()
+    except Exception:
+        return 0
+
+
+def _mb(n: int) -> str:
+    return f"{n / 2**20:,.1f} MB"
+
+
+def authorized() -> bool:
+    token = st.query_params.get("token", "")
+    return bool(config.ADMIN_TOKEN) and hmac.compare_digest(
+        token.encode(), config.ADMIN_TOKEN.encode()
+    )
+
+
+st.set_page_config(page_title="Quản trị hiệu năng", layout="wide")
+if not authorized():
+    st.warning("Trang quản trị chưa bật hoặc thiếu token truy cập.")
+    st.stop()
+st.markdown("### 📊 Hiệu năng OCR + Chat")
+
+window_label = st.radio("Khoảng thời gian", list(WINDOWS), horizontal=True)
+
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def dashboard(window_seconds):
+    ocr = admission.stats()
+    cache = registry.stats()
+    sessions = streamlit_sessions()
+    rss = process_rss()
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("OCR đang chạy", f"{ocr['active']}/{ocr['max_concurrent']}")
+    c2.metric("Hàng đợi OCR", f"{ocr['waiting']}/{ocr['max_queue']}",
+              help=f"Đã nhận {ocr['admitted']}, đã từ chối {ocr['rejected']}")
+    lookups = cache["hits"] + cache["misses"]
+    c3.metric("Tỉ lệ trúng cache",
+              f"{cache['hits'] / lookups:.0%}" if lookups else "—",
+              help=f"{cache['hits']} trúng / {cache['misses']} trượt, "
+                   f"{cache['evictions']} lần loại bỏ")
+    c4.metric("Phiên đang mở", sessions or cache["sessions"])
+
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Bộ nhớ process", _mb(rss) if rss else "—")
+    m2.metric("Bộ nhớ / phiên", _mb(rss / sessions) if rss and sessions else "—")
+    m3.metric("Cache tài liệu", f"{_mb(cache['bytes'])} / {_mb(cache['max_bytes'])}")
+    m4.metric("Tài liệu trong cache",
+              f"{cache['documents']} ({cache['active']} đang dùng)")
+
+    rows = []
+    for label, stages in LATENCY_GROUPS.items():
+        values = recent_durations(stages, window_seconds)
+        rows.append({
+            "Giai đoạn": label,
+            "Số lần": len(values),
+            "p50 (s)": round(percentile(values, 50), 3),
+            "p95 (s)": round(percentile(values, 95), 3),
+            "p99 (s)": round(percentile(values, 99), 3),
+            "Max (s)": round(values[-1], 3) if values else 0.0,
+        })
+    st.markdown("#### ⏱️ Độ trễ gần đây")
+    st.dataframe(rows, hide_index=True, use_container_width=True)
+    st.caption(f"Tự cập nhật mỗi {REFRESH_SECONDS}s")
+
+
+dashboard(WINDOWS[window_label])
@@ -0,0 +1,205 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import streamlit as st
+
+from pipeline import UploadTooLarge, check_upload_size, spool_upload
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # Không có pypdfium2 -> dùng st.pdf
+    pdfium = None
+
+# ============================
+# XEM TRƯỚC PDF (ẢNH TRANG CACHE THEO HASH)
+# ============================
+#
+# Mỗi trang PDF được raster hóa 1 lần ở độ phân giải thấp, lưu trên đĩa
+# theo hash tài liệu. Rerun chỉ gửi lại vài ảnh nhỏ đang hiển thị,
+# không base64 cả file PDF vào iframe.
+#
+# File upload được chép ra đĩa 1 lần (theo từng khối, hash trong lúc chép)
+# và dùng chung cho xem trước lẫn OCR.
+#
+# Thư mục của mỗi tài liệu được "chạm" (mtime) mỗi lần dùng; khi có file
+# upload mới, các thư mục lâu không dùng nhất bị xóa cho tới khi tổng dung
+# lượng dưới PDF_PREVIEW_MAX_MB. Thư mục được dùng trong PREVIEW_IN_USE_SECONDS
+# giây gần đây (session khác đang xem / OCR) không bị xóa.
+
+PREVIEW_DIR = Path(
+    os.environ.get(
+        "PDF_PREVIEW_DIR",
+        Path(tempfile.gettempdir()) / "chatwithdocument_preview",
+    )
+)
+PREVIEW_MAX_BYTES = int(os.environ.get("PDF_PREVIEW_MAX_MB", "2048")) * 1024 * 1024
+# File .part cũ hơn chừng này (giây) là do lần chép bị ngắt
+STALE_PART_SECONDS = 3600
+PREVIEW_IN_USE_SECONDS = int(os.environ.get("PDF_PREVIEW_IN_USE_SECONDS", "600"))
+PREVIEW_SCALE = 1.0  # 72 DPI
+PREVIEW_BATCH = 3
+
+_render_lock = threading.Lock()
+
+
+def _dir_size(path: Path) -> int:
+    total = 0
+    for f in path.rglob("*"):
+        try:
+            total += f.stat().st_size
+        except OSError:  # Bị xóa giữa chừng
+            pass
+    return total
+
+
+def prune_preview_dir(keep: Path = None, max_bytes: int = PREVIEW_MAX_BYTES):
+    # Xóa thư mục tài liệu dùng lâu nhất trước; không đụng tới `keep` và các
+    # thư mục vừa được dùng (có thể vượt giới hạn 1 thời gian)
+    if not max_bytes or not PREVIEW_DIR.exists():
+        return
+    now = time.time()
+    docs = []
+    for path in PREVIEW_DIR.iterdir():
+        try:
+            mtime = path.stat().st_mtime
+        except OSError:
+            continue
+        if path.is_dir():
+            docs.append((mtime, path, _dir_size(path)))
+        elif path.suffix == ".part" and now - mtime > STALE_PART_SECONDS:
+            path.unlink(missing_ok=True)
+
+    total = sum(size for _, _, size in docs)
+    for mtime, path, size in sorted(docs):
+        if total <= max_bytes or now - mtime < PREVIEW_IN_USE_SECONDS:
+            break
+        if path == keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+def _touch(path: Path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def upload_file(label: str, **kwargs):
+    # st.file_uploader + chặn file quá lớn ngay khi chọn, trước khi xem
+    # trước / OCR; quá lớn -> báo lỗi và trả về None
+    uploaded_file = st.file_uploader(label, **kwargs)
+    if uploaded_file is None:
+        return None
+    try:
+        check_upload_size(uploaded_file.size)
+    except UploadTooLarge as e:
+        st.error(f"❌ {e}")
+        return None
+    return uploaded_file
+
+
+def spooled_upload(uploaded_file):
+    # (hash, đường dẫn trên đĩa) của file upload, chép 1 lần cho mỗi file
+    cache = st.session_state.setdefault("_uploads", {})
+    entry = cache.get(uploaded_file.file_id)
+    if entry is not None and entry[1].exists():
+        _touch(entry[1].parent)
+        return entry
+
+    PREVIEW_DIR.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=PREVIEW_DIR, suffix=".part")
+    os.close(fd)
+    doc_hash = spool_upload(uploaded_file, Path(tmp))
+    path = PREVIEW_DIR / doc_hash / f"source{Path(uploaded_file.name).suffix.lower()}"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(tmp, path)
+    _touch(path.parent)
+    # Session đổi sang tài liệu khác -> bỏ tham chiếu tới file cũ
+    cache.clear()
+    entry = cache[uploaded_file.file_id] = (doc_hash, path)
+    prune_preview_dir(keep=path.parent)
+    return entry
+
+
+@st.cache_data(show_spinner=False)
+def page_count(doc_hash: str, pdf_path: str) -> int:
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def render_page_image(doc_hash: str, pdf_path: str, index: int) -> Path:
+    out = PREVIEW_DIR / doc_hash / f"page-{index + 1:04d}.webp"
+    if out.exists():
+        return out
+
+    # pdfium không an toàn khi gọi song song từ nhiều thread
+    with _render_lock:
+        if out.exists():
+            return out
+        if not Path(pdf_path).exists():
+            raise FileNotFoundError(pdf_path)
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            image = pdf[index].render(scale=PREVIEW_SCALE).to_pil()
+        finally:
+            pdf.close()
+        # Thư mục có thể vừa bị prune_preview_dir xóa
+        out.parent.mkdir(parents=True, exist_ok=True)
+        tmp = out.with_suffix(".part")
+        image.save(tmp, format="WEBP", quality=70)
+        os.replace(tmp, out)
+    return out
+
+
+def _show_more(shown_key: str, total: int):
+    st.session_state[shown_key] = min(
+        st.session_state[shown_key] + PREVIEW_BATCH, total
+    )
+
+
+def render_pdf_preview(uploaded_file, key: str = "preview", height: int = 600):
+    if pdfium is None:
+        st.pdf(uploaded_file, height=height)
+        return
+
+    doc_hash, pdf_path = spooled_upload(uploaded_file)
+    pdf_path = str(pdf_path)
+    total = page_count(doc_hash, pdf_path)
+
+    # Số trang đã hiển thị, tăng dần khi người dùng cuộn xuống và bấm "Xem thêm"
+    shown_key = f"{key}_shown_{doc_hash}"
+    shown = st.session_state.setdefault(shown_key, min(PREVIEW_BATCH, total))
+
+    with st.container(height=height):
+        for i in range(shown):
+            try:
+                image = render_page_image(doc_hash, pdf_path, i)
+            except FileNotFoundError:
+                # File nguồn vừa bị dọn (prune từ session khác) -> chép lại
+                st.session_state["_uploads"].pop(uploaded_file.file_id, None)
+                doc_hash, pdf_path = spooled_upload(uploaded_file)
+                pdf_path = str(pdf_path)
+                image = render_page_image(doc_hash, pdf_path, i)
+            st.image(
+                str(image),
+                caption=f"Trang {i + 1}/{total}",
+                use_container_width=True
+            )
+
+        if shown < total:
+            st.button(
+                f"⬇️ Xem thêm trang ({shown}/{total})",
+                key=f"{key}_more",
+                on_click=_show_more,
+                args=(shown_key, total),
+                use_container_width=True
+            )
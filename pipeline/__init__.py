@@ -0,0 +1,109 @@
+import importlib
+
+# Nhẹ (chỉ thư viện chuẩn) và trùng tên module con -> nạp ngay
+from pipeline.admission import OcrQueueFull, admission
+from pipeline.cache import DocumentHandle, registry
+
+# ============================
+# EXPORT NẠP LƯỜI
+# ============================
+#
+# `from pipeline import X` chỉ nạp module con chứa X ở lần dùng đầu tiên,
+# app Streamlit không phải chờ requests / bs4 / numpy / sqlite khi mở trang.
+
+_EXPORTS = {
+    "run_chandra_cli": "chandra",
+    "answer_corpus_question": "corpus",
+    "format_sources": "corpus",
+    "retrieve": "corpus",
+    "stream_corpus_answer": "corpus",
+    "sync_vector_index": "corpus",
+    "EMPTY_DOCUMENT": "core",
+    "UploadTooLarge": "core",
+    "answer_question": "core",
+    "check_upload_size": "core",
+    "content_hash": "core",
+    "index_document": "core",
+    "ingest": "core",
+    "load_or_process": "core",
+    "open_document": "core",
+    "parse_output": "core",
+    "process_file": "core",
+    "run_ocr": "core",
+    "spool_upload": "core",
+    "stream_answer": "core",
+    "render_prometheus": "metrics",
+    "span": "metrics",
+    "start_metrics_server": "metrics",
+    "chat_with_ollama": "ollama",
+    "embed_texts": "ollama",
+    "stream_chat_with_ollama": "ollama",
+    "build_llm_context": "parse",
+    "read_ocr_images": "parse",
+    "read_ocr_text_and_tables": "parse",
+    "scan_ocr_output": "parse",
+    "split_pages": "parse",
+    "table_html_to_text": "parse",
+    "DocumentStore": "store",
+    "get_store": "store",
+    "answer_table_question": "tables",
+    "parse_tables": "tables",
+}
+
+# Liệt kê tường minh (công cụ tĩnh / import * cần danh sách cố định);
+# phải khớp với _EXPORTS
+__all__ = [
+    "OcrQueueFull",
+    "admission",
+    "DocumentHandle",
+    "registry",
+    "run_chandra_cli",
+    "answer_corpus_question",
+    "format_sources",
+    "retrieve",
+    "stream_corpus_answer",
+    "sync_vector_index",
+    "EMPTY_DOCUMENT",
+    "UploadTooLarge",
+    "answer_question",
+    "check_upload_size",
+    "content_hash",
+    "index_document",
+    "ingest",
+    "load_or_process",
+    "open_document",
+    "parse_output",
+    "process_file",
+    "run_ocr",
+    "spool_upload",
+    "stream_answer",
+    "render_prometheus",
+    "span",
+    "start_metrics_server",
+    "chat_with_ollama",
+    "embed_texts",
+    "stream_chat_with_ollama",
+    "build_llm_context",
+    "read_ocr_images",
+    "read_ocr_text_and_tables",
+    "scan_ocr_output",
+    "split_pages",
+    "table_html_to_text",
+    "DocumentStore",
+    "get_store",
+    "answer_table_question",
+    "parse_tables",
+]
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module 'pipeline' has no attribute {name!r}")
+    value = getattr(importlib.import_module(f"pipeline.{module}"), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
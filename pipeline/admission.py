@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# ============================
+# GIỚI HẠN SỐ JOB OCR CHẠY ĐỒNG THỜI
+# ============================
+#
+# Mỗi lần chạy chandra nạp lại model và chiếm nhiều RAM / CPU. Bộ điều phối
+# dùng chung trong process chỉ cho phép OCR_MAX_CONCURRENT job chạy cùng lúc,
+# hàng đợi đầy thì từ chối ngay.
+#
+# Job chờ được xếp theo chi phí (job ngắn trước): điểm = chi phí (megapixel)
+# x hệ số ưu tiên (batch nặng hơn interactive) - thời gian đã chờ /
+# OCR_AGING_SECONDS. Job lớn chờ đủ lâu sẽ lên đầu, không bị bỏ đói.
+# Cùng điểm thì ai đến trước chạy trước (như FIFO cũ).
+
+OCR_MAX_CONCURRENT = int(os.environ.get("OCR_MAX_CONCURRENT", "2"))
+OCR_MAX_QUEUE = int(os.environ.get("OCR_MAX_QUEUE", "8"))
+# Số giây chờ để bù 1 megapixel chi phí
+OCR_AGING_SECONDS = float(os.environ.get("OCR_AGING_SECONDS", "2"))
+PRIORITY_WEIGHTS = {"interactive": 1.0, "batch": 4.0}
+WAIT_POLL_SECONDS = 0.5
+
+
+class OcrQueueFull(RuntimeError):
+    pass
+
+
+class _Ticket:
+    def __init__(self, cost: float, priority: str, since: float):
+        self.cost = cost
+        self.weight = PRIORITY_WEIGHTS.get(priority, PRIORITY_WEIGHTS["batch"])
+        self.since = since
+
+    def score(self, now: float, aging_seconds: float) -> float:
+        aging = (now - self.since) / aging_seconds if aging_seconds > 0 else 0.0
+        return self.cost * self.weight - aging
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent: int = OCR_MAX_CONCURRENT,
+                 max_queue: int = OCR_MAX_QUEUE,
+                 aging_seconds: float = OCR_AGING_SECONDS):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.aging_seconds = aging_seconds
+        self._cond = threading.Condition()
+        # Thứ tự đến; job được chọn theo _order()
+        self._waiting = []
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def _order(self) -> list:
+        # Gọi khi đang giữ lock. sort ổn định -> cùng điểm giữ thứ tự đến
+        now = time.monotonic()
+        return sorted(self._waiting, key=lambda t: t.score(now, self.aging_seconds))
+
+    @contextmanager
+    def slot(self, on_wait=None, cost: float = 1.0, priority: str = "interactive",
+             since: float = None):
+        # on_wait(position): báo vị trí trong hàng đợi (1 = sắp tới lượt,
+        # 0 = đã được chạy).
+        # since: thời điểm (time.monotonic) job vào hàng lần đầu; job chạy
+        # từng phần truyền lại để giữ thời gian chờ đã tích lũy, và không
+        # bị từ chối vì hàng đầy ở các phần sau.
+        requeue = since is not None
+        ticket = _Ticket(cost, priority, time.monotonic() if since is None else since)
+
+        with self._cond:
+            if self.active < self.max_concurrent and not self._waiting:
+                self.active += 1
+                ticket = None
+            elif len(self._waiting) >= self.max_queue and not requeue:
+                self.rejected += 1
+                raise OcrQueueFull(
+                    f"Hàng đợi OCR đã đầy ({len(self._waiting)} job đang chờ)"
+                )
+            else:
+                self._waiting.append(ticket)
+
+        try:
+            last_position = None
+            while ticket is not None:
+                with self._cond:
+                    order = self._order()
+                    if order[0] is ticket and self.active < self.max_concurrent:
+                        self._waiting.remove(ticket)
+                        self.active += 1
+                        ticket = None
+                        self._cond.notify_all()
+                        break
+                    position = order.index(ticket) + 1
+
+                # Gọi callback ngoài lock (callback có thể vẽ UI)
+                if on_wait is not None and position != last_position:
+                    on_wait(position)
+                    last_position = position
+
+                with self._cond:
+                    if not (self._order()[0] is ticket
+                            and self.active < self.max_concurrent):
+                        self._cond.wait(WAIT_POLL_SECONDS)
+        except BaseException:
+            with self._cond:
+                if ticket is not None:
+                    self._waiting.remove(ticket)
+                    self._cond.notify_all()
+            raise
+
+        with self._cond:
+            self.admitted += 1
+        if on_wait is not None and last_position is not None:
+            on_wait(0)  # 0 = hết chờ, bắt đầu chạy
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.active -= 1
+                self._cond.notify_all()
+
+    def run(self, fn, *args, on_wait=None, **kwargs):
+        with self.slot(on_wait):
+            return fn(*args, **kwargs)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "active": self.active,
+                "waiting": len(self._waiting),
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+            }
+
+
+admission = AdmissionController()
@@ -0,0 +1,461 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+# ============================
+# CHỈ MỤC VECTOR XẤP XỈ (IVF) TRÊN ĐĨA
+# ============================
+#
+# Vector (float32, đã chuẩn hóa) được ghi nối đuôi vào file và đọc bằng
+# memmap, nên khởi động không nạp toàn bộ vào RAM. Sau khi đủ dữ liệu,
+# k-means chia vector thành NLIST cụm; truy vấn chỉ quét NPROBE cụm gần
+# nhất thay vì cả kho. Thêm tài liệu mới = gán vào cụm gần nhất.
+#
+# Khi quét cụm chỉ đọc bản int8 của vector (nhỏ hơn 4 lần, nằm gọn trong
+# page cache); RERANK_FACTOR x k ứng viên tốt nhất được chấm lại bằng
+# float32 để giữ đúng thứ tự.
+#
+# Thư mục chỉ mục:
+#   meta.json        dim, số cụm, đã train chưa
+#   centroids.npy    tâm cụm (nlist x dim)
+#   vectors.f32      vector, mỗi dòng dim x float32
+#   vectors.i8       vector lượng tử hóa, mỗi dòng dim x int8
+#   scales.f32       hệ số int8 -> float của từng dòng
+#   ids.i64          id đoạn (chunks.id) tương ứng từng dòng
+#   lists.i32        cụm của từng dòng (-1 = chưa gán)
+#
+# Các file dòng được ghi nối đuôi lần lượt, ids.i64 sau cùng; process chết
+# giữa chừng -> khi mở lại, cắt mọi file về cùng số dòng hoàn chỉnh.
+
+# Số byte / dòng của từng file, tính theo dim
+ROW_FILES = {
+    "vectors.f32": lambda dim: dim * 4,
+    "vectors.i8": lambda dim: dim,
+    "scales.f32": lambda dim: 4,
+    "lists.i32": lambda dim: 4,
+    "ids.i64": lambda dim: 8,
+}
+
+VECTOR_INDEX_DIR = Path(
+    os.environ.get(
+        "VECTOR_INDEX_DIR",
+        Path(__file__).resolve().parent.parent / "vector_index",
+    )
+)
+NLIST = int(os.environ.get("VECTOR_NLIST", "1024"))
+NPROBE = int(os.environ.get("VECTOR_NPROBE", "16"))
+TRAIN_MIN_POINTS = 39  # số điểm tối thiểu / cụm để train
+KMEANS_ITERATIONS = 20
+KMEANS_SAMPLE = 100_000
+SCAN_BLOCK = 65_536
+RERANK_FACTOR = int(os.environ.get("VECTOR_RERANK", "4"))
+
+
+def normalize(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize(vectors: np.ndarray):
+    # int8 đối xứng theo từng dòng: v ~ codes * scale
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def kmeans(data: np.ndarray, k: int, iterations: int = KMEANS_ITERATIONS,
+           seed: int = 0) -> np.ndarray:
+    # Spherical k-means (cosine) đơn giản, đủ cho việc chia cụm IVF
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(data @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        # Cụm rỗng -> lấy ngẫu nhiên 1 điểm làm tâm mới
+        sums[empty] = data[rng.choice(len(data), size=int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    if len(scores) <= k:
+        return np.argsort(-scores)
+    part = np.argpartition(-scores, k)[:k]
+    return part[np.argsort(-scores[part])]
+
+
+class IVFIndex:
+    def __init__(self, path: Path = VECTOR_INDEX_DIR, dim: int = None,
+                 nlist: int = NLIST):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        meta_file = self.path / "meta.json"
+
+        if meta_file.exists():
+            meta = json.loads(meta_file.read_text(encoding="utf-8"))
+            self.dim = meta["dim"]
+            self.nlist = meta["nlist"]
+            self.trained = meta["trained"]
+        else:
+            if dim is None:
+                raise ValueError(f"Chưa có chỉ mục tại {self.path}, cần truyền dim")
+            self.dim = dim
+            self.nlist = nlist
+            self.trained = False
+            self.path.mkdir(parents=True, exist_ok=True)
+            for name in ROW_FILES:
+                (self.path / name).touch()
+            self._write_meta()
+
+        if not (self.path / "vectors.i8").exists():
+            self._build_codes()
+        self._truncate_rows()
+
+        self.centroids = (
+            np.load(self.path / "centroids.npy") if self.trained else None
+        )
+        self._load_lists()
+
+    # ----- FILE -----
+
+    def _write_meta(self):
+        tmp = self.path / "meta.json.part"
+        tmp.write_text(
+            json.dumps({"dim": self.dim, "nlist": self.nlist, "trained": self.trained}),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self.path / "meta.json")
+
+    def _truncate_rows(self):
+        # Bỏ các dòng ghi dở (có trong file này nhưng chưa có trong file khác)
+        rows = min(
+            (self.path / name).stat().st_size // row_bytes(self.dim)
+            for name, row_bytes in ROW_FILES.items()
+        )
+        for name, row_bytes in ROW_FILES.items():
+            size = rows * row_bytes(self.dim)
+            if (self.path / name).stat().st_size != size:
+                os.truncate(self.path / name, size)
+
+    def __len__(self):
+        return (self.path / "ids.i64").stat().st_size // 8
+
+    def last_id(self) -> int:
+        # ids được thêm theo thứ tự tăng dần -> id cuối = id lớn nhất
+        count = len(self)
+        return int(self._ids(count)[-1]) if count else 0
+
+    def _vectors(self, count: int):
+        if count == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.memmap(
+            self.path / "vectors.f32", dtype=np.float32, mode="r",
+            shape=(count, self.dim),
+        )
+
+    def _codes(self, count: int):
+        if count == 0:
+            return np.empty((0, self.dim), dtype=np.int8)
+        return np.memmap(
+            self.path / "vectors.i8", dtype=np.int8, mode="r", shape=(count, self.dim),
+        )
+
+    def _scales(self, count: int):
+        if count == 0:
+            return np.empty(0, dtype=np.float32)
+        return np.memmap(self.path / "scales.f32", dtype=np.float32, mode="r", shape=(count,))
+
+    def _build_codes(self):
+        # Chỉ mục tạo trước khi có bản int8 -> lượng tử hóa 1 lần từ float32
+        count = len(self)
+        vectors = self._vectors(count)
+        tmp_codes = self.path / "vectors.i8.part"
+        tmp_scales = self.path / "scales.f32.part"
+        with open(tmp_codes, "wb") as fc, open(tmp_scales, "wb") as fs:
+            for start in range(0, count, SCAN_BLOCK):
+                codes, scales = quantize(np.asarray(vectors[start:start + SCAN_BLOCK]))
+                fc.write(codes.tobytes())
+                fs.write(scales.tobytes())
+        os.replace(tmp_scales, self.path / "scales.f32")
+        os.replace(tmp_codes, self.path / "vectors.i8")
+
+    def memory_footprint(self) -> dict:
+        # Số byte của từng phần trên đĩa; khi tìm kiếm, phần "scan" là phần nóng
+        sizes = {name: (self.path / name).stat().st_size for name in ROW_FILES}
+        sizes["scan_int8"] = sizes["vectors.i8"] + sizes["scales.f32"]
+        sizes["scan_float32"] = sizes["vectors.f32"]
+        return sizes
+
+    def _ids(self, count: int):
+        if count == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.memmap(self.path / "ids.i64", dtype=np.int64, mode="r", shape=(count,))
+
+    def _load_lists(self, centroids: np.ndarray = None):
+        # Danh sách dòng theo từng cụm, dựng từ lists.i32 (4 byte / vector).
+        # search() không giữ khóa: trạng thái đọc khi tìm kiếm (tâm cụm, danh
+        # sách cụm, số dòng) được dựng xong rồi mới gán 1 lần vào self._view
+        centroids = self.centroids if centroids is None else centroids
+        count = len(self)
+        assign = (
+            np.fromfile(self.path / "lists.i32", dtype=np.int32, count=count)
+            if count else np.empty(0, dtype=np.int32)
+        )
+        unassigned = np.flatnonzero(assign < 0)
+        if centroids is not None:
+            order = np.argsort(assign, kind="stable")
+            bounds = np.searchsorted(assign[order], np.arange(self.nlist + 1))
+            lists = [order[bounds[i]:bounds[i + 1]] for i in range(self.nlist)]
+        else:
+            lists = None
+        self._view = (centroids, lists, unassigned, count)
+
+    # ----- GHI -----
+
+    def add(self, ids, vectors):
+        vectors = normalize(vectors)
+        ids = np.asarray(ids, dtype=np.int64)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"dim {vectors.shape[1]} != {self.dim}")
+
+        with self._lock:
+            if self.trained:
+                assign = np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+            else:
+                assign = np.full(len(ids), -1, dtype=np.int32)
+
+            codes, scales = quantize(vectors)
+            with open(self.path / "vectors.f32", "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self.path / "vectors.i8", "ab") as f:
+                f.write(codes.tobytes())
+            with open(self.path / "scales.f32", "ab") as f:
+                f.write(scales.tobytes())
+            with open(self.path / "lists.i32", "ab") as f:
+                f.write(assign.tobytes())
+            # ids ghi sau cùng: số dòng hợp lệ = kích thước ids.i64
+            with open(self.path / "ids.i64", "ab") as f:
+                f.write(ids.tobytes())
+
+            if not self.trained and len(self) >= self.nlist * TRAIN_MIN_POINTS:
+                self._train()
+            else:
+                self._append_lists(assign)
+
+    def _append_lists(self, assign: np.ndarray):
+        # Thêm các dòng mới vào danh sách cụm đang có, không đọc lại
+        # lists.i32 (đọc lại + argsort mỗi lần thêm -> N lần thêm tốn O(N²)).
+        # Chỉ chép lại các cụm có dòng mới; search() vẫn thấy view cũ trọn vẹn
+        centroids, lists, unassigned, count = self._view
+        rows = np.arange(count, count + len(assign))
+        if (assign < 0).any():
+            unassigned = np.concatenate([unassigned, rows[assign < 0]])
+        if lists is not None:
+            lists = list(lists)
+            order = np.argsort(assign, kind="stable")
+            clusters, starts = np.unique(assign[order], return_index=True)
+            ends = np.append(starts[1:], len(order))
+            for c, lo, hi in zip(clusters, starts, ends):
+                if c >= 0:
+                    lists[c] = np.concatenate([lists[c], rows[order[lo:hi]]])
+        self._view = (centroids, lists, unassigned, count + len(assign))
+
+    def _train(self):
+        count = len(self)
+        vectors = self._vectors(count)
+        rng = np.random.default_rng(0)
+        sample = rng.choice(count, size=min(count, KMEANS_SAMPLE), replace=False)
+        centroids = kmeans(np.asarray(vectors[np.sort(sample)]), self.nlist)
+
+        assign = np.empty(count, dtype=np.int32)
+        for start in range(0, count, SCAN_BLOCK):
+            block = np.asarray(vectors[start:start + SCAN_BLOCK])
+            assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+
+        np.save(self.path / "centroids.npy", centroids)
+        assign.tofile(self.path / "lists.i32")
+        # Dựng xong danh sách cụm rồi mới bật trained (trong RAM và meta.json)
+        self._load_lists(centroids)
+        self.centroids = centroids
+        self.trained = True
+        self._write_meta()
+
+    def train(self):
+        with self._lock:
+            if len(self) >= self.nlist:
+                self._train()
+
+    # ----- TÌM KIẾM -----
+
+    def search(self, query, k: int = 10, nprobe: int = NPROBE, quantized: bool = True):
+        # Trả về (ids, scores) cosine, giảm dần
+        centroids, lists, unassigned, count = self._view
+        if centroids is None:
+            return self.search_exact(query, k)
+
+        q = normalize(query)[0]
+        probes = top_k(centroids @ q, nprobe)
+        rows = np.concatenate([lists[p] for p in probes] + [unassigned])
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        rows.sort()  # đọc memmap theo thứ tự -> ít seek
+        if quantized:
+            # Lọc thô trên int8, chấm lại ít ứng viên bằng float32
+            approx = (self._codes(count)[rows] @ q) * self._scales(count)[rows]
+            rows = np.sort(rows[top_k(approx, k * RERANK_FACTOR)])
+
+        scores = self._vectors(count)[rows] @ q
+        best = top_k(scores, k)
+        return np.asarray(self._ids(count)[rows[best]]), scores[best]
+
+    def search_exact(self, query, k: int = 10):
+        q = normalize(query)[0]
+        count = len(self)
+        vectors = self._vectors(count)
+
+        best_scores = np.empty(0, dtype=np.float32)
+        best_rows = np.empty(0, dtype=np.int64)
+        for start in range(0, count, SCAN_BLOCK):
+            scores = np.asarray(vectors[start:start + SCAN_BLOCK]) @ q
+            keep = top_k(scores, k)
+            best_scores = np.concatenate([best_scores, scores[keep]])
+            best_rows = np.concatenate([best_rows, keep + start])
+            keep = top_k(best_scores, k)
+            best_scores, best_rows = best_scores[keep], best_rows[keep]
+
+        return np.asarray(self._ids(count)[best_rows]), best_scores
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index(dim: int = None):
+    # Mở chỉ mục dùng chung; chưa có trên đĩa thì tạo khi biết dim
+    global _index
+    with _index_lock:
+        if _index is None and (
+            dim is not None or (VECTOR_INDEX_DIR / "meta.json").exists()
+        ):
+            _index = IVFIndex(VECTOR_INDEX_DIR, dim=dim)
+        return _index
+
+
+def reset_index(dim: int):
+    # Đổi model embedding (khác số chiều) -> xóa chỉ mục cũ, tạo chỉ mục rỗng
+    global _index
+    with _index_lock:
+        _index = None
+        shutil.rmtree(VECTOR_INDEX_DIR, ignore_errors=True)
+        _index = IVFIndex(VECTOR_INDEX_DIR, dim=dim)
+        return _index
+
+
+# ============================
+# BENCHMARK: IVF (FLOAT32 / INT8) vs QUÉT TOÀN BỘ
+# ============================
+#
+#   python -m pipeline.ann --vectors 1000000 --dim 768 --nprobe 8,16,32
+
+def synthetic_vectors(count: int, dim: int, clusters: int = 2000, seed: int = 0):
+    # Dữ liệu có cụm giống embedding thật (văn bản cùng chủ đề nằm gần nhau);
+    # tâm cụm cố định, seed chỉ đổi cách lấy mẫu
+    centers = normalize(np.random.default_rng(0).standard_normal((clusters, dim)))
+    rng = np.random.default_rng(seed + 1)
+    for start in range(0, count, SCAN_BLOCK):
+        n = min(SCAN_BLOCK, count - start)
+        noise = rng.standard_normal((n, dim)).astype(np.float32) * (1.5 / np.sqrt(dim))
+        yield centers[rng.integers(0, clusters, n)] + noise
+
+
+def _measure(search, queries, exact) -> tuple:
+    start = time.perf_counter()
+    found = [set(search(q)[0].tolist()) for q in queries]
+    ms = (time.perf_counter() - start) * 1000 / len(queries)
+    recall = np.mean([len(f & e) / len(e) for f, e in zip(found, exact)])
+    return ms, float(recall)
+
+
+def benchmark(index: "IVFIndex", queries: np.ndarray, k: int, nprobes) -> list:
+    sizes = index.memory_footprint()
+    print(
+        f"bộ nhớ quét: float32 {sizes['scan_float32'] / 2**20:8.1f} MiB  "
+        f"int8 {sizes['scan_int8'] / 2**20:8.1f} MiB"
+    )
+
+    start = time.perf_counter()
+    exact = [set(index.search_exact(q, k)[0].tolist()) for q in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    print(f"brute force            {exact_ms:8.2f} ms/truy vấn  recall@{k}=1.000")
+
+    results = [{"nprobe": 0, "quantized": False, "ms": exact_ms, "recall": 1.0}]
+    for nprobe in nprobes:
+        for quantized in (False, True):
+            ms, recall = _measure(
+                lambda q: index.search(q, k, nprobe=nprobe, quantized=quantized),
+                queries, exact,
+            )
+            kind = "int8" if quantized else "f32 "
+            print(f"ivf {kind} nprobe={nprobe:<5} {ms:8.2f} ms/truy vấn  recall@{k}={recall:.3f}")
+            results.append({"nprobe": nprobe, "quantized": quantized, "ms": ms, "recall": recall})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Đo recall / độ trễ / bộ nhớ của chỉ mục IVF (float32 và int8)"
+    )
+    parser.add_argument("--vectors", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--nlist", type=int, default=NLIST)
+    parser.add_argument("--nprobe", default="4,8,16,32")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--index", type=Path, metavar="DIR",
+                        help="đo trên chỉ mục có sẵn thay vì dữ liệu tổng hợp")
+    args = parser.parse_args(argv)
+
+    nprobes = [int(n) for n in args.nprobe.split(",") if n.strip()]
+    rng = np.random.default_rng(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.index:
+            index = IVFIndex(args.index)
+            count = len(index)
+            rows = np.sort(rng.choice(count, size=min(args.queries, count), replace=False))
+            queries = np.asarray(index._vectors(count)[rows])
+        else:
+            index = IVFIndex(Path(tmp) / "index", dim=args.dim, nlist=args.nlist)
+            start = time.perf_counter()
+            next_id = 1
+            for block in synthetic_vectors(args.vectors, args.dim):
+                index.add(np.arange(next_id, next_id + len(block)), block)
+                next_id += len(block)
+            if not index.trained:
+                index.train()
+            print(f"dựng {len(index)} vector trong {time.perf_counter() - start:.1f}s")
+            queries = next(synthetic_vectors(args.queries, args.dim, seed=1))
+
+        queries = queries + rng.standard_normal(queries.shape).astype(np.float32) * 0.02
+        benchmark(index, queries, args.k, nprobes)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
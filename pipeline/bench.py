@@ -0,0 +1,304 @@
+import argparse
+import ast
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from pipeline import images
+from pipeline.parse import (
+    build_llm_context,
+    chunk_pages,
+    read_ocr_blocks,
+    read_ocr_images,
+    read_ocr_text_and_tables,
+    split_pages,
+    table_html_to_text,
+)
+
+try:
+    from PIL import Image
+except ImportError:  # Không có Pillow -> ảnh giả (bytes ngẫu nhiên)
+    Image = None
+
+# ============================
+# MICRO-BENCHMARK: ĐỌC OUTPUT OCR & DỰNG NGỮ CẢNH
+# ============================
+#
+# Sinh cây thư mục giống output của chandra (mỗi trang 1 file .md, vài
+# file .html nhiều bảng, nhiều ảnh), đo các bước đọc / dựng ngữ cảnh và
+# so với baseline đã lưu:
+#
+#   python -m pipeline.bench                   # so với baseline, lỗi nếu chậm hơn ngưỡng
+#   python -m pipeline.bench --save-baseline   # ghi lại baseline trên máy hiện tại
+#   python -m pipeline.bench --imports         # thời gian import của từng app
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(os.environ.get("BENCH_BASELINE", ROOT / "bench_baseline.json"))
+REGRESSION_RATIO = 1.25   # chậm hơn baseline 25% -> báo lỗi
+NOISE_FLOOR = 0.005       # chênh dưới 5 ms coi như nhiễu
+# Bước có ghi đĩa dao động nhiều giữa các lần chạy -> ngưỡng rộng hơn
+CASE_RATIOS = {"read_ocr_images": 2.0}
+# Thời gian import phụ thuộc nhiều vào cache đĩa của máy -> ngưỡng rộng hơn
+IMPORT_RATIO = 1.5
+
+WORDS = (
+    "doanh thu lợi nhuận chi phí năm quý tăng giảm so với cùng kỳ báo cáo "
+    "tài chính công ty cổ phần hợp nhất vốn chủ sở hữu tổng tài sản nợ "
+    "phải trả ngắn hạn dài hạn tiền mặt hàng tồn kho thuế thu nhập"
+).split()
+
+
+# ----- SINH DỮ LIỆU -----
+
+def _paragraph(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _table_html(rng: random.Random, rows: int, cols: int) -> str:
+    header = "".join(f"<th>Cột {c + 1}</th>" for c in range(cols))
+    body = "".join(
+        "<tr><td>" + _paragraph(rng, 2) + "</td>"
+        + "".join(f"<td>{rng.randint(1, 10**7):,}</td>" for _ in range(cols - 1))
+        + "</tr>"
+        for _ in range(rows)
+    )
+    return f"<table><thead><tr>{header}</tr></thead><tbody>{body}</tbody></table>"
+
+
+def _image_bytes(rng: random.Random, size) -> bytes:
+    if Image is None:
+        return b"\x89PNG\r\n\x1a\n" + rng.randbytes(size[0] * size[1] // 4)
+    import io
+
+    im = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    buf = io.BytesIO()
+    im.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def make_output_tree(root: Path, pages: int = 500, html_files: int = 20,
+                     tables_per_html: int = 25, image_count: int = 200,
+                     image_size=(800, 600), seed: int = 0) -> Path:
+    # Cấu trúc giống chandra: <root>/<tên file>/page_XXXX.md, .html, ảnh
+    rng = random.Random(seed)
+    out = root / "input"
+    out.mkdir(parents=True, exist_ok=True)
+
+    for p in range(1, pages + 1):
+        paras = [_paragraph(rng, rng.randint(30, 80)) for _ in range(rng.randint(4, 10))]
+        (out / f"page_{p:04d}.md").write_text("\n\n".join(paras), encoding="utf-8")
+
+    for h in range(1, html_files + 1):
+        tables = "\n".join(
+            _table_html(rng, rng.randint(5, 40), rng.randint(3, 8))
+            for _ in range(tables_per_html)
+        )
+        (out / f"page_{h:04d}.html").write_text(
+            f"<html><body><p>{_paragraph(rng, 20)}</p>{tables}</body></html>",
+            encoding="utf-8",
+        )
+
+    for i in range(1, image_count + 1):
+        (out / f"image_{i:04d}.png").write_bytes(_image_bytes(rng, image_size))
+
+    return root
+
+
+# ----- ĐO -----
+
+def _time(fn, repeat: int, setup=None) -> dict:
+    # 1 lần chạy nóng máy (page cache, import lười) không tính vào kết quả
+    if setup is not None:
+        setup()
+    fn()
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {"min": min(samples), "median": statistics.median(samples)}
+
+
+def run_benchmarks(tree: Path, repeat: int = 5) -> dict:
+    text, tables_html = read_ocr_text_and_tables(tree)
+    text_blocks, _ = read_ocr_blocks(tree)
+
+    def fresh_image_store():
+        # Mỗi lần đo ghi vào kho ảnh trống, đo đúng chi phí lần ingest đầu
+        images.IMAGE_STORE_DIR = Path(tempfile.mkdtemp(dir=tree.parent))
+
+    old_store = images.IMAGE_STORE_DIR
+    try:
+        return {
+            "read_ocr_text_and_tables": _time(lambda: read_ocr_text_and_tables(tree), repeat),
+            "table_html_to_text": _time(
+                lambda: [table_html_to_text(t) for t in tables_html], repeat
+            ),
+            "read_ocr_images": _time(lambda: read_ocr_images(tree), repeat, fresh_image_store),
+            "split_and_chunk_pages": _time(
+                lambda: chunk_pages(split_pages(text_blocks)), repeat
+            ),
+            "build_llm_context": _time(lambda: build_llm_context(text, tables_html), repeat),
+        }
+    finally:
+        images.IMAGE_STORE_DIR = old_store
+
+
+# ----- THỜI GIAN IMPORT CỦA TỪNG APP -----
+
+def entry_scripts() -> list:
+    return [
+        *sorted(ROOT.glob("appMock*.py")),
+        ROOT / "server.py",
+        *sorted((ROOT / "pages").glob("*.py")),
+    ]
+
+
+def _import_code(script: Path) -> str:
+    # Chỉ các lệnh import ở đầu script (phần chạy trước khi vẽ trang đầu tiên)
+    tree = ast.parse(script.read_text(encoding="utf-8"))
+    return "\n".join(
+        ast.unparse(node) for node in tree.body
+        if isinstance(node, (ast.Import, ast.ImportFrom))
+    )
+
+
+def _importtime(code: str):
+    # Tổng thời gian (giây) các module cấp 1 theo -X importtime, lỗi -> None
+    r = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if r.returncode != 0:
+        return None, {}
+    modules = {}
+    for line in r.stderr.splitlines():
+        parts = line.split("|")
+        if not line.startswith("import time:") or len(parts) != 3:
+            continue
+        name = parts[2]
+        if not parts[1].strip().isdigit() or len(name) - len(name.lstrip()) != 1:
+            continue
+        modules[name.strip()] = int(parts[1]) / 1e6
+    return sum(modules.values()), modules
+
+
+def run_import_benchmarks(repeat: int = 5) -> dict:
+    # Trừ đi phần interpreter tự import lúc khởi động (site, encodings...)
+    startup_runs = [_importtime("pass") for _ in range(repeat)]
+    startup = min(total for total, _ in startup_runs)
+    startup_modules = set(startup_runs[0][1])
+    results = {}
+    for script in entry_scripts():
+        code = _import_code(script)
+        samples = []
+        heaviest = {}
+        for _ in range(repeat):
+            total, modules = _importtime(code)
+            if total is None:
+                break
+            samples.append(max(0.0, total - startup))
+            heaviest = modules
+        name = str(script.relative_to(ROOT))
+        if not samples:
+            print(f"{name:<26} bỏ qua (thiếu thư viện)")
+            continue
+        own = {m: t for m, t in heaviest.items() if m not in startup_modules}
+        top = sorted(own.items(), key=lambda kv: -kv[1])[:3]
+        print(f"{name:<26} nặng nhất: " + ", ".join(f"{m} {t * 1000:.0f} ms" for m, t in top))
+        results[name] = {"min": min(samples), "median": statistics.median(samples)}
+    return results
+
+
+def compare(results: dict, baseline: dict, ratio: float = REGRESSION_RATIO) -> list:
+    # So sánh thời gian nhỏ nhất (ít nhiễu nhất) với baseline, trả về các
+    # bước bị chậm đi
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        case_ratio = max(ratio, CASE_RATIOS.get(name, ratio))
+        limit = max(base["min"] * case_ratio, base["min"] + NOISE_FLOOR)
+        if result["min"] > limit:
+            regressions.append((name, base["min"], result["min"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đo tốc độ đọc output OCR và dựng ngữ cảnh")
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--html-files", type=int, default=20)
+    parser.add_argument("--tables-per-html", type=int, default=25)
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--ratio", type=float, default=REGRESSION_RATIO,
+                        help="ngưỡng chậm đi so với baseline (1.25 = +25%%)")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--imports", action="store_true",
+                        help="đo thời gian import của từng app thay vì đọc output OCR")
+    args = parser.parse_args(argv)
+
+    saved = {}
+    if args.baseline.exists():
+        saved = json.loads(args.baseline.read_text(encoding="utf-8"))
+
+    params = {
+        "pages": args.pages,
+        "html_files": args.html_files,
+        "tables_per_html": args.tables_per_html,
+        "images": args.images,
+        # Có Pillow thì read_ocr_images còn tạo thumbnail -> chậm hơn nhiều,
+        # baseline đo khác điều kiện thì không so được
+        "thumbnails": images.Image is not None,
+    }
+    if args.imports:
+        section = "imports"
+        results = run_import_benchmarks(repeat=args.repeat)
+        baseline = saved.get(section, {})
+    else:
+        section = "results"
+        with tempfile.TemporaryDirectory() as tmp:
+            tree = make_output_tree(
+                Path(tmp) / "output", pages=args.pages, html_files=args.html_files,
+                tables_per_html=args.tables_per_html, image_count=args.images,
+            )
+            results = run_benchmarks(tree, repeat=args.repeat)
+        baseline = {}
+        if saved.get("params") == params:
+            baseline = saved.get(section, {})
+        elif saved and not args.save_baseline:
+            print("Tham số khác baseline, chỉ in kết quả, không so sánh")
+
+    for name, result in results.items():
+        base = baseline.get(name)
+        delta = f"  ({result['min'] / base['min']:.2f}x baseline)" if base else ""
+        print(f"{name:<26} median {result['median'] * 1000:9.1f} ms  "
+              f"min {result['min'] * 1000:9.1f} ms{delta}")
+
+    if args.save_baseline:
+        saved[section] = results
+        if section == "results":
+            saved["params"] = params
+        args.baseline.write_text(json.dumps(saved, indent=2), encoding="utf-8")
+        print(f"Đã lưu baseline vào {args.baseline}")
+        return 0
+
+    ratio = max(args.ratio, IMPORT_RATIO) if args.imports else args.ratio
+    regressions = compare(results, baseline, ratio)
+    for name, base, now in regressions:
+        print(f"CHẬM HƠN: {name} {base * 1000:.1f} ms -> {now * 1000:.1f} ms")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+import os
+import sys
+import threading
+import time
+import weakref
+from array import array
+from collections import OrderedDict, deque
+
+# ============================
+# CACHE TÀI LIỆU DÙNG CHUNG GIỮA CÁC SESSION
+# ============================
+#
+# Kết quả OCR được giữ 1 bản duy nhất trong process, khóa theo hash nội dung.
+# Session chỉ giữ DocumentHandle (khóa + tham chiếu). Tài liệu không còn
+# session nào dùng sẽ bị loại (LRU) khi vượt giới hạn bộ nhớ.
+
+DOC_CACHE_MAX_BYTES = int(os.environ.get("DOC_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+
+def estimate_size(obj) -> int:
+    if isinstance(obj, str):
+        return sys.getsizeof(obj)
+    if isinstance(obj, (bytes, bytearray, array)):
+        return sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(
+            estimate_size(k) + estimate_size(v) for k, v in obj.items()
+        )
+    if isinstance(obj, (list, tuple, set)):
+        return sys.getsizeof(obj) + sum(estimate_size(v) for v in obj)
+    if hasattr(obj, "__dict__"):
+        return estimate_size(vars(obj))
+    return sys.getsizeof(obj)
+
+
+class _Entry:
+    def __init__(self, data):
+        self.data = data
+        self.size = estimate_size(data)
+        self.refs = 0
+        self.last_used = time.monotonic()
+
+
+class DocumentRegistry:
+    def __init__(self, max_bytes: int = DOC_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._building = {}
+        # Key do finalizer (GC) nhả, chờ xử lý dưới khóa
+        self._released = deque()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            self._drain_released()
+            return key in self._entries
+
+    def open(self, key: str, build):
+        # Trả về DocumentHandle; nếu chưa có thì gọi build() đúng 1 lần,
+        # các session khác mở cùng tài liệu sẽ chờ kết quả đó.
+        while True:
+            with self._lock:
+                self._drain_released()
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    return self._acquire(key, entry)
+
+                event = self._building.get(key)
+                if event is None:
+                    self.misses += 1
+                    event = self._building[key] = threading.Event()
+                    break
+
+            event.wait()
+
+        try:
+            data = build()
+        except BaseException:
+            with self._lock:
+                del self._building[key]
+            event.set()
+            raise
+
+        with self._lock:
+            entry = _Entry(data)
+            self._entries[key] = entry
+            self.total_bytes += entry.size
+            del self._building[key]
+            handle = self._acquire(key, entry)
+            self._drain_released()
+            self._evict()
+        event.set()
+        return handle
+
+    def _acquire(self, key, entry):
+        entry.refs += 1
+        entry.last_used = time.monotonic()
+        self._entries.move_to_end(key)
+        return DocumentHandle(self, key, entry.data)
+
+    def _release(self, key: str):
+        with self._lock:
+            self._drain_released()
+            self._decref(key)
+            self._evict()
+
+    def _release_later(self, key: str):
+        # Gọi từ finalizer: GC có thể chạy ngay trong lúc thread này đang giữ
+        # _lock (Lock không reentrant) -> không chờ khóa, chỉ xếp key vào
+        # hàng; lấy được khóa thì xử lý luôn, không thì lần gọi sau xử lý
+        self._released.append(key)
+        if self._lock.acquire(blocking=False):
+            try:
+                self._drain_released()
+            finally:
+                self._lock.release()
+
+    def _drain_released(self):
+        if not self._released:
+            return
+        while self._released:
+            self._decref(self._released.popleft())
+        self._evict()
+
+    def _decref(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        entry.refs = max(0, entry.refs - 1)
+        entry.last_used = time.monotonic()
+
+    def _evict(self):
+        # Chỉ loại tài liệu không còn session nào giữ, cũ nhất trước
+        if self.total_bytes <= self.max_bytes:
+            return
+        for key in list(self._entries):
+            entry = self._entries[key]
+            if entry.refs:
+                continue
+            del self._entries[key]
+            self.total_bytes -= entry.size
+            self.evictions += 1
+            if self.total_bytes <= self.max_bytes:
+                break
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._drain_released()
+            return {
+                "documents": len(self._entries),
+                "active": sum(1 for e in self._entries.values() if e.refs),
+                "sessions": sum(e.refs for e in self._entries.values()),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class DocumentHandle:
+    def __init__(self, registry: DocumentRegistry, key: str, data):
+        self.key = key
+        self.data = data
+        self._registry = registry
+        # Session kết thúc -> session_state bị thu gom -> tự nhả tham chiếu
+        self._finalizer = weakref.finalize(self, registry._release_later, key)
+
+    def release(self):
+        if self._finalizer.detach() is not None:
+            self._registry._release(self.key)
+
+
+registry = DocumentRegistry()
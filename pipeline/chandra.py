@@ -0,0 +1,228 @@
+import os
+import queue
+import re
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import wait
+from pathlib import Path
+
+from pipeline import config
+from pipeline.threads import thread_env
+
+# ============================
+# CHẠY CHANDRA CLI
+# ============================
+#
+# chandra chạy như subprocess asyncio trên 1 event loop nền dùng chung cho
+# mọi job OCR. Output được đọc theo từng dòng (kể cả dòng tqdm kết thúc
+# bằng \r) để báo tiến độ (số trang đã xong) qua callback. Job chạy quá
+# CHANDRA_TIMEOUT giây, hoặc không in gì trong CHANDRA_IDLE_TIMEOUT giây,
+# bị dừng cùng cả nhóm process (chandra có thể sinh process con).
+#
+# asyncio (kéo theo asyncio.subprocess) chỉ được nạp khi chạy OCR lần đầu,
+# không nạp khi app import pipeline.
+
+# "3/10", "page 3 of 10", "Trang 3/10"...
+PROGRESS_RE = re.compile(r"(\d+)\s*(?:/|of)\s*(\d+)", re.IGNORECASE)
+# Thanh tiến độ lúc nạp / tải model ("Loading checkpoint shards: 1/4",
+# "Fetching 3 files: 2/3") không phải số trang
+NOT_PAGE_PROGRESS_RE = re.compile(
+    r"checkpoint|shard|download|fetching|loading", re.IGNORECASE
+)
+LINE_SPLIT_RE = re.compile(rb"[\r\n]")
+READ_CHUNK = 4096
+TAIL_LINES = 50
+KILL_GRACE_SECONDS = 5
+
+
+class ChandraTimeout(RuntimeError):
+    pass
+
+
+def _command(input_file: Path, output_dir: Path, page_range: str = None) -> list:
+    cmd = [
+        "chandra",
+        str(input_file),
+        str(output_dir),
+        "--method",
+        config.CHANDRA_METHOD
+    ]
+    if page_range:
+        cmd += ["--page-range", page_range]
+    return cmd
+
+
+def parse_progress(line: str, expected_total: int = None):
+    # Trả về (đã xong, tổng) hoặc None; biết trước số trang thì bỏ các
+    # dòng có tổng khác (tiến độ của việc khác)
+    if NOT_PAGE_PROGRESS_RE.search(line):
+        return None
+    match = PROGRESS_RE.search(line)
+    if match is None:
+        return None
+    done, total = int(match.group(1)), int(match.group(2))
+    if total <= 0 or done > total:
+        return None
+    if expected_total and total != expected_total:
+        return None
+    return done, total
+
+
+def _signal_group(proc, sig):
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, sig)
+        elif sig == signal.SIGTERM:
+            proc.terminate()
+        else:
+            proc.kill()
+    except ProcessLookupError:
+        pass
+
+
+async def _kill_group(proc):
+    # SIGTERM cả nhóm, chờ 1 chút rồi SIGKILL
+    import asyncio
+
+    if proc.returncode is not None:
+        return
+    _signal_group(proc, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(proc.wait(), KILL_GRACE_SECONDS)
+    except asyncio.TimeoutError:
+        _signal_group(proc, getattr(signal, "SIGKILL", signal.SIGTERM))
+        await proc.wait()
+
+
+async def run_chandra_async(input_file: Path, output_dir: Path, threads: int = None,
+                            on_progress=None, timeout: float = None,
+                            idle_timeout: float = None, page_range: str = None,
+                            expected_pages: int = None):
+    # on_progress(done, total) được gọi trên event loop, phải nhanh, không chặn
+    import asyncio
+
+    timeout = config.CHANDRA_TIMEOUT if timeout is None else timeout
+    idle_timeout = config.CHANDRA_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+
+    proc = await asyncio.create_subprocess_exec(
+        *_command(input_file, output_dir, page_range),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+        env=thread_env(threads) if threads else None,
+        start_new_session=os.name == "posix",
+    )
+    started = time.monotonic()
+    tail = deque(maxlen=TAIL_LINES)
+    last_progress = None
+    pending = b""
+
+    def handle_line(raw: bytes):
+        nonlocal last_progress
+        line = raw.decode("utf-8", errors="replace").strip()
+        if not line:
+            return
+        tail.append(line)
+        progress = parse_progress(line, expected_pages)
+        if progress is not None and progress != last_progress:
+            last_progress = progress
+            if on_progress is not None:
+                on_progress(*progress)
+
+    try:
+        while True:
+            wait_for = idle_timeout or None
+            if timeout:
+                remaining = timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    raise ChandraTimeout(f"chandra chạy quá {timeout:g}s")
+                wait_for = min(wait_for or remaining, remaining)
+            try:
+                chunk = await asyncio.wait_for(proc.stdout.read(READ_CHUNK), wait_for)
+            except asyncio.TimeoutError:
+                if timeout and time.monotonic() - started >= timeout:
+                    raise ChandraTimeout(f"chandra chạy quá {timeout:g}s")
+                raise ChandraTimeout(f"chandra không phản hồi trong {idle_timeout:g}s")
+            if not chunk:
+                break
+            *lines, pending = LINE_SPLIT_RE.split(pending + chunk)
+            for raw in lines:
+                handle_line(raw)
+        handle_line(pending)
+        try:
+            # Đóng output nhưng không thoát (process con giữ lại...) -> dừng
+            returncode = await asyncio.wait_for(proc.wait(), KILL_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            raise ChandraTimeout(
+                f"chandra đã đóng output nhưng không thoát sau {KILL_GRACE_SECONDS}s"
+            ) from None
+    except ChandraTimeout as e:
+        await _kill_group(proc)
+        raise ChandraTimeout("\n".join([str(e), *list(tail)[-5:]])) from None
+    finally:
+        # Bị hủy (người dùng bỏ / process thoát) -> không để lại chandra mồ côi
+        if proc.returncode is None:
+            await asyncio.shield(_kill_group(proc))
+
+    if returncode != 0:
+        raise RuntimeError("\n".join(tail))
+
+
+# ----- EVENT LOOP NỀN DÙNG CHUNG -----
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def supervisor_loop():
+    # 1 event loop cho mọi job OCR trong process, chạy trên thread riêng
+    global _loop
+    import asyncio
+
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="chandra-supervisor", daemon=True
+            ).start()
+        return _loop
+
+
+def run_chandra_cli(input_file: Path, output_dir: Path, threads: int = None,
+                    on_progress=None, timeout: float = None, idle_timeout: float = None,
+                    page_range: str = None, expected_pages: int = None):
+    # page_range: "1-16" (đánh số từ 1) -> chỉ OCR các trang đó
+    # expected_pages: số trang của lần chạy này (nếu biết) để lọc tiến độ
+    # Bản đồng bộ: chờ job trên loop nền, on_progress được gọi trên thread
+    # của người gọi (an toàn cho Streamlit)
+    import asyncio
+
+    updates = queue.SimpleQueue()
+    future = asyncio.run_coroutine_threadsafe(
+        run_chandra_async(
+            input_file, output_dir, threads=threads,
+            on_progress=(lambda done, total: updates.put((done, total))) if on_progress else None,
+            timeout=timeout, idle_timeout=idle_timeout, page_range=page_range,
+            expected_pages=expected_pages,
+        ),
+        supervisor_loop(),
+    )
+
+    def drain():
+        while True:
+            try:
+                progress = updates.get_nowait()
+            except queue.Empty:
+                return
+            on_progress(*progress)
+
+    try:
+        while not future.done():
+            wait([future], timeout=0.5)
+            if on_progress is not None:
+                drain()
+        return future.result()
+    except BaseException:
+        future.cancel()
+        raise
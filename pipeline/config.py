@@ -0,0 +1,40 @@
+import os
+
+# ============================
+# CẤU HÌNH
+# ============================
+
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://14.241.244.57:11434/api/chat")
+MODEL_NAME = os.environ.get("OLLAMA_MODEL", "llama3.1:8b")
+OLLAMA_TIMEOUT = int(os.environ.get("OLLAMA_TIMEOUT", "300"))
+
+# Embedding cho tìm kiếm ngữ nghĩa trên kho, mặc định tắt: mỗi câu hỏi trên
+# kho sẽ phải gọi Ollama embed câu hỏi (đặt EMBED_MODEL=nomic-embed-text để bật)
+EMBED_URL = os.environ.get(
+    "OLLAMA_EMBED_URL", OLLAMA_URL.rsplit("/api/", 1)[0] + "/api/embed"
+)
+EMBED_MODEL = os.environ.get("EMBED_MODEL", "")
+EMBED_BATCH = int(os.environ.get("EMBED_BATCH", "64"))
+# Embed câu hỏi nằm trên đường trả lời -> quá hạn thì chỉ tìm theo từ khóa
+EMBED_QUERY_TIMEOUT = float(os.environ.get("EMBED_QUERY_TIMEOUT", "2"))
+
+# Giới hạn dung lượng file upload (MB), 0 = không giới hạn
+MAX_UPLOAD_MB = int(os.environ.get("MAX_UPLOAD_MB", "200"))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+
+CHANDRA_METHOD = os.environ.get("CHANDRA_METHOD", "hf")
+# Dừng chandra nếu chạy quá lâu / không in gì quá lâu (giây), 0 = không giới hạn
+CHANDRA_TIMEOUT = float(os.environ.get("CHANDRA_TIMEOUT", "3600"))
+CHANDRA_IDLE_TIMEOUT = float(os.environ.get("CHANDRA_IDLE_TIMEOUT", "600"))
+
+# PDF dài được OCR từng phần OCR_SLICE_PAGES trang (chandra --page-range);
+# giữa các phần, job khác đang chờ (ngắn hơn) được chen lên; 0 = không chia
+OCR_SLICE_PAGES = int(os.environ.get("OCR_SLICE_PAGES", "16"))
+# Job tối đa bấy nhiêu trang mới được coi là interactive (nếu không chỉ định)
+OCR_INTERACTIVE_MAX_PAGES = int(os.environ.get("OCR_INTERACTIVE_MAX_PAGES", "4"))
+
+# Trang quản trị (pages/admin.py) chỉ mở khi có ?token=<ADMIN_TOKEN> trên URL;
+# để trống = tắt trang
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
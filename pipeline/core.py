@@ -0,0 +1,383 @@
+import hashlib
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from pipeline import config
+from pipeline.admission import admission
+from pipeline.cache import registry
+from pipeline.chandra import run_chandra_cli
+from pipeline.corpus import sync_vector_index_in_background
+from pipeline.estimate import estimate_ocr_job
+from pipeline.metrics import collect_stages, record, span, timed_stream, trace
+from pipeline.ollama import chat_with_ollama, stream_chat_with_ollama
+from pipeline.parse import (
+    build_llm_context,
+    read_ocr_blocks,
+    read_ocr_images,
+    scan_ocr_output,
+    split_pages,
+)
+from pipeline.requestlog import error_text, log_question, log_request
+from pipeline.store import get_store
+from pipeline.tables import answer_table_question, parse_tables
+from pipeline.threads import threads_for_job
+
+# ============================
+# PIPELINE: INGEST → OCR → PARSE → INDEX → ANSWER
+# ============================
+#
+# Tài liệu là 1 dict: key, name, text, pages, tables_html, tables, images,
+# llm_context. Không phụ thuộc Streamlit, gọi được từ script / benchmark.
+
+CHUNK_SIZE = 1024 * 1024
+
+EMPTY_DOCUMENT = {
+    "key": "",
+    "name": "",
+    "bytes": 0,
+    "text": "",
+    "pages": [],
+    "tables_html": [],
+    "tables": [],
+    "images": [],
+    "llm_context": "",
+}
+
+
+def _open_source(source):
+    # source: đường dẫn, bytes / memoryview, hoặc file object (UploadedFile)
+    if isinstance(source, (str, Path)):
+        return open(source, "rb"), True
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return None, False
+    source.seek(0)
+    return source, False
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def check_upload_size(size: int, max_bytes: int = None):
+    max_bytes = config.MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    if max_bytes and size > max_bytes:
+        raise UploadTooLarge(
+            f"File {size / 2**20:.1f} MB vượt giới hạn {max_bytes / 2**20:.0f} MB"
+        )
+
+
+def content_hash(source) -> str:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(source).hexdigest()
+
+    f, owned = _open_source(source)
+    h = hashlib.sha256()
+    try:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    finally:
+        if owned:
+            f.close()
+        else:
+            f.seek(0)
+    return h.hexdigest()
+
+
+def ingest(source, workdir: Path, name: str = "input") -> Path:
+    input_file = Path(workdir) / f"input{Path(name).suffix.lower()}"
+
+    with span("ingest"):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            input_file.write_bytes(source)
+            return input_file
+
+        f, owned = _open_source(source)
+        try:
+            with open(input_file, "wb") as out:
+                shutil.copyfileobj(f, out, CHUNK_SIZE)
+        finally:
+            if owned:
+                f.close()
+            else:
+                f.seek(0)
+    return input_file
+
+
+def spool_upload(source, dest: Path, max_bytes: int = None, size: int = None) -> str:
+    # Chép file upload ra đĩa theo từng khối, tính hash trong lúc chép ->
+    # RAM dùng thêm chỉ 1 khối dù file lớn cỡ nào. Trả về hash nội dung.
+    max_bytes = config.MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    # Biết trước dung lượng (UploadedFile.size, bytes) -> từ chối trước khi chép
+    if size is None:
+        size = getattr(source, "size", None)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        size = memoryview(source).nbytes
+    if size is not None:
+        check_upload_size(size, max_bytes)
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source).cast("B")
+        chunks = (view[i:i + CHUNK_SIZE] for i in range(0, len(view), CHUNK_SIZE))
+        f, owned = None, False
+    else:
+        f, owned = _open_source(source)
+        chunks = iter(lambda: f.read(CHUNK_SIZE), b"")
+
+    h = hashlib.sha256()
+    written = 0
+    try:
+        with span("ingest"), open(dest, "wb") as out:
+            for chunk in chunks:
+                written += len(chunk)
+                check_upload_size(written, max_bytes)
+                h.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        Path(dest).unlink(missing_ok=True)
+        raise
+    finally:
+        if owned:
+            f.close()
+        elif f is not None:
+            f.seek(0)
+    return h.hexdigest()
+
+
+def _sliceable(job: dict, input_file: Path) -> bool:
+    # Chỉ PDF biết chính xác số trang và dài hơn 1 phần mới chia được
+    slice_pages = config.OCR_SLICE_PAGES
+    return (input_file.suffix.lower() == ".pdf" and job["exact"]
+            and bool(slice_pages) and job["pages"] > slice_pages)
+
+
+def run_ocr(input_file: Path, output_dir: Path, on_wait=None, on_progress=None,
+            priority: str = None):
+    # Giới hạn số chandra chạy đồng thời trong cả process,
+    # số luồng mỗi job chia theo số job đang chạy.
+    # on_progress(done, total): số trang chandra đã OCR xong
+    # priority: "interactive" / "batch"; mặc định theo số trang
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with span("estimate_ocr_job"):
+        job = estimate_ocr_job(input_file)
+    pages = job["pages"]
+    if priority is None:
+        priority = "interactive" if pages <= config.OCR_INTERACTIVE_MAX_PAGES else "batch"
+    sliceable = _sliceable(job, input_file)
+
+    if not sliceable:
+        # Ảnh, PDF ngắn / không rõ số trang (kể cả pages = 0): chạy 1 lần
+        queued = time.perf_counter()
+        with admission.slot(on_wait, cost=job["megapixels"], priority=priority):
+            record("ocr_queue", time.perf_counter() - queued)
+            threads = threads_for_job(admission.active)
+            with span("run_chandra_cli"):
+                run_chandra_cli(input_file, output_dir, threads=threads,
+                                on_progress=on_progress,
+                                expected_pages=pages if job["exact"] and pages else None)
+        return
+
+    # PDF dài chạy từng phần OCR_SLICE_PAGES trang. Sau mỗi phần, có job khác
+    # đang chờ thì trả slot và xếp hàng lại (chi phí còn lại, thời gian chờ
+    # tính từ lần đầu) -> job dài nhường chỗ cho job ngắn ở ranh giới trang,
+    # kể cả job đến sau khi job dài đã bắt đầu.
+    since = None
+    first = 1
+    while first <= pages:
+        cost = job["megapixels"] * (pages - first + 1) / pages
+        queued = time.perf_counter()
+        enqueued = time.monotonic()
+        with admission.slot(on_wait, cost=cost, priority=priority, since=since):
+            record("ocr_queue", time.perf_counter() - queued)
+            while first <= pages:
+                last = min(first + config.OCR_SLICE_PAGES - 1, pages)
+                _run_slice(input_file, output_dir, first, last, pages, on_progress)
+                first = last + 1
+                if admission.stats()["waiting"]:
+                    break
+        since = since if since is not None else enqueued
+
+
+def _run_slice(input_file: Path, output_dir: Path, first: int, last: int,
+               pages: int, on_progress=None):
+    # Thư mục part_00001, part_00017... -> đọc lại đúng thứ tự trang
+    threads = threads_for_job(admission.active)
+    with span("run_chandra_cli"):
+        run_chandra_cli(
+            input_file, output_dir / f"part_{first:05d}", threads=threads,
+            on_progress=(
+                lambda done, total, offset=first - 1: on_progress(offset + done, pages)
+            ) if on_progress else None,
+            page_range=f"{first}-{last}",
+            expected_pages=last - first + 1,
+        )
+
+
+def parse_output(output_dir: Path) -> dict:
+    # Duyệt thư mục output 1 lần, các bước sau chỉ đọc file trong manifest
+    with span("read_ocr_text_and_tables"):
+        manifest = scan_ocr_output(output_dir)
+        text_blocks, tables_html = read_ocr_blocks(output_dir, manifest)
+        pages = split_pages(text_blocks)
+    with span("parse_tables"):
+        tables = parse_tables(tables_html)
+    with span("read_ocr_images"):
+        images = read_ocr_images(output_dir, manifest)
+
+    return dict(
+        EMPTY_DOCUMENT,
+        text="\n\n".join(pages),
+        pages=pages,
+        tables_html=tables_html,
+        tables=tables,
+        images=images,
+    )
+
+
+def index_document(doc: dict) -> dict:
+    with span("build_llm_context"):
+        doc["llm_context"] = build_llm_context(doc["text"], doc["tables_html"])
+    return doc
+
+
+def _doc_labels(doc: dict) -> dict:
+    return {"size_bytes": doc["bytes"], "pages": len(doc["pages"])}
+
+
+def _doc_fields(doc: dict) -> dict:
+    return {"doc_hash": doc["key"], "pages": len(doc["pages"]), "bytes": doc["bytes"]}
+
+
+def answer_question(doc: dict, question: str) -> str:
+    started = time.perf_counter()
+    usage = {}
+    table_answer = None
+    error = None
+    try:
+        with collect_stages() as stages, trace(**_doc_labels(doc)):
+            # Câu hỏi số học trên bảng -> trả lời ngay, không gọi LLM
+            with span("answer_table_question"):
+                table_answer = answer_table_question(question, doc["tables"])
+            if table_answer:
+                return table_answer
+            return chat_with_ollama(doc["llm_context"], question, usage=usage)
+    except Exception as e:
+        error = error_text(e)
+        raise
+    finally:
+        log_question(
+            question, started, stages, usage, error=error, **_doc_fields(doc),
+            table_answer=bool(table_answer),
+        )
+
+
+def stream_answer(doc: dict, question: str):
+    # Generator được đọc dần (có thể từ thread khác) -> tự đo, không dùng trace()
+    started = time.perf_counter()
+    stages = {}
+    usage = {}
+    table_answer = None
+    error = None
+    try:
+        table_answer = answer_table_question(question, doc["tables"])
+        stages["answer_table_question"] = time.perf_counter() - started
+        if table_answer:
+            yield table_answer
+            return
+        yield from timed_stream(
+            "stream_chat_with_ollama",
+            stream_chat_with_ollama(doc["llm_context"], question, usage=usage),
+            stages=stages,
+            **_doc_labels(doc),
+        )
+    except Exception as e:
+        error = error_text(e)
+        raise
+    finally:
+        log_question(
+            question, started, stages, usage, error=error, **_doc_fields(doc),
+            table_answer=bool(table_answer),
+        )
+
+
+def process_file(source, name: str = "input", on_wait=None, key: str = None,
+                 on_progress=None, priority: str = None) -> dict:
+    # Số trang chỉ biết sau OCR -> gom span trong trace, ghi với nhãn đầy đủ ở cuối
+    with trace() as labels, tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        input_file = ingest(source, tmp, name)
+        output_dir = tmp / "ocr_output"
+
+        run_ocr(input_file, output_dir, on_wait=on_wait, on_progress=on_progress,
+                priority=priority)
+
+        doc = index_document(parse_output(output_dir))
+        doc["bytes"] = input_file.stat().st_size
+        labels.update(_doc_labels(doc))
+
+    doc["key"] = key or content_hash(source)
+    doc["name"] = Path(name).name
+    return doc
+
+
+def load_or_process(source, name: str = "input", on_wait=None, key: str = None,
+                    on_progress=None, priority: str = None) -> dict:
+    # Đã OCR trước đây (kể cả trước khi khởi động lại) -> đọc từ SQLite
+    key = key or content_hash(source)
+    store = get_store()
+
+    doc = store.load_document(key)
+    if doc is not None:
+        return index_document(doc)
+
+    doc = process_file(
+        source, name, on_wait=on_wait, key=key, on_progress=on_progress, priority=priority
+    )
+    store.save_document(doc)
+    sync_vector_index_in_background()
+    return doc
+
+
+def open_document(source, name: str = "input", on_wait=None, key: str = None,
+                  on_progress=None, priority: str = None):
+    # Tài liệu đã được session khác OCR -> dùng lại từ cache chung
+    key = key or content_hash(source)
+    started = time.perf_counter()
+    built = []
+    handle = None
+    error = None
+
+    def build():
+        built.append(True)
+        return load_or_process(
+            source, name, on_wait=on_wait, key=key, on_progress=on_progress,
+            priority=priority,
+        )
+
+    try:
+        with collect_stages() as stages:
+            handle = registry.open(key, build)
+        return handle
+    except Exception as e:
+        error = error_text(e)
+        raise
+    finally:
+        # Có bước ingest = phải OCR (kể cả bị từ chối vì hàng đợi đầy)
+        if not built:
+            cache = "memory"
+        else:
+            cache = "ocr" if "ingest" in stages else "store"
+        doc = handle.data if handle is not None else None
+        log_request(
+            "document",
+            stages=stages,
+            doc_hash=key,
+            name=Path(name).name,
+            pages=len(doc["pages"]) if doc else None,
+            bytes=doc["bytes"] if doc else None,
+            cache=cache,
+            ocr_method=config.CHANDRA_METHOD,
+            seconds=round(time.perf_counter() - started, 4),
+            error=error,
+        )
@@ -0,0 +1,213 @@
+import importlib.util
+import logging
+import threading
+import time
+
+from pipeline import config
+from pipeline.metrics import collect_stages, span, timed_stream
+from pipeline.ollama import chat_with_ollama, embed_texts, stream_chat_with_ollama
+from pipeline.requestlog import error_text, log_question
+from pipeline.store import get_store
+
+# ============================
+# HỎI ĐÁP TRÊN TOÀN BỘ KHO TÀI LIỆU
+# ============================
+#
+# Tìm các đoạn liên quan trên mọi tài liệu (chunks_fts, bm25), giữ lại
+# vài tài liệu tốt nhất và vài đoạn tốt nhất của mỗi tài liệu, rồi mới
+# gửi phần ngữ cảnh nhỏ đó cho LLM.
+#
+# Nếu đã có chỉ mục vector (pipeline.ann), kết quả bm25 được trộn với kết
+# quả tìm theo embedding bằng reciprocal rank fusion.
+
+CANDIDATE_CHUNKS = 200
+TOP_DOCUMENTS = 5
+PASSAGES_PER_DOCUMENT = 3
+MAX_CONTEXT_CHARS = 12000
+RRF_K = 60
+EMBED_SYNC_BATCH = 512
+
+_sync_lock = threading.Lock()
+log = logging.getLogger(__name__)
+
+
+def get_index(dim: int = None):
+    # numpy chỉ được nạp ở lần tìm / thêm vector đầu tiên
+    try:
+        from pipeline.ann import get_index as open_index
+    except ImportError:  # Không có numpy -> chỉ tìm theo từ khóa
+        return None
+    return open_index(dim)
+
+
+def vector_search_enabled() -> bool:
+    # Kiểm tra có numpy mà không import (find_spec không nạp module)
+    return bool(config.EMBED_MODEL) and importlib.util.find_spec("numpy") is not None
+
+
+def sync_vector_index() -> int:
+    # Embed các đoạn mới lưu (id > id cuối trong chỉ mục), trả về số đoạn đã thêm
+    if not vector_search_enabled():
+        return 0
+    store = get_store()
+    added = 0
+    with _sync_lock:
+        index = get_index()
+        last_id = index.last_id() if index is not None else 0
+        while True:
+            batch = store.chunks_after(last_id, limit=EMBED_SYNC_BATCH)
+            if not batch:
+                return added
+            ids = [chunk_id for chunk_id, _ in batch]
+            vectors = embed_texts(text for _, text in batch)
+            dim = len(vectors[0])
+            if index is not None and index.dim != dim:
+                # Đổi EMBED_MODEL: vector cũ không so được với vector mới
+                # -> dựng lại chỉ mục từ đầu kho
+                from pipeline.ann import reset_index
+
+                log.warning("Số chiều embedding đổi %d -> %d, dựng lại chỉ mục vector",
+                            index.dim, dim)
+                index = reset_index(dim)
+                last_id = 0
+                continue
+            if index is None:
+                index = get_index(dim=dim)
+            index.add(ids, vectors)
+            last_id = ids[-1]
+            added += len(ids)
+
+
+def sync_vector_index_in_background():
+    # Gọi sau khi lưu tài liệu mới; lỗi kết nối Ollama không ảnh hưởng OCR
+    def run():
+        try:
+            sync_vector_index()
+        except OSError as e:
+            # Ollama không chạy / mất kết nối -> lần lưu tài liệu sau thử lại
+            log.warning("Không embed được đoạn mới: %s", e)
+        except Exception:
+            # Ollama trả về sai định dạng, chỉ mục hỏng...: ghi lại, không để
+            # thread chết im lặng
+            log.exception("Đồng bộ chỉ mục vector thất bại")
+
+    threading.Thread(target=run, name="embed-sync", daemon=True).start()
+
+
+def _semantic_hits(question: str, limit: int) -> list:
+    if not vector_search_enabled():
+        return []
+    index = get_index()
+    if index is None or len(index) == 0:
+        return []
+    try:
+        query = embed_texts([question], timeout=config.EMBED_QUERY_TIMEOUT)[0]
+        ids, _ = index.search(query, k=limit)
+    except (OSError, KeyError, IndexError, ValueError):
+        # Ollama chậm / lỗi / trả về sai định dạng, hoặc chỉ mục đang dựng lại
+        # với số chiều khác -> chỉ dùng bm25
+        return []
+    return get_store().get_chunks(ids)
+
+
+def _fuse(*rankings) -> list:
+    # Reciprocal rank fusion: điểm = tổng 1 / (RRF_K + hạng) qua các danh sách
+    scores = {}
+    hits = {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking):
+            ident = (hit["key"], hit["page_no"], hit["text"])
+            hits.setdefault(ident, hit)
+            scores[ident] = scores.get(ident, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return [hits[i] for i in sorted(scores, key=scores.get, reverse=True)]
+
+
+def retrieve(question: str, top_documents: int = TOP_DOCUMENTS,
+             passages_per_document: int = PASSAGES_PER_DOCUMENT) -> list:
+    with span("search_chunks"):
+        hits = get_store().search_chunks(question, limit=CANDIDATE_CHUNKS)
+    with span("semantic_search"):
+        semantic = _semantic_hits(question, CANDIDATE_CHUNKS)
+    if semantic:
+        hits = _fuse(hits, semantic)
+
+    # hits đã xếp theo độ liên quan giảm dần: tài liệu xuất hiện trước là
+    # tài liệu có đoạn tốt nhất
+    by_doc = {}
+    for hit in hits:
+        passages = by_doc.get(hit["key"])
+        if passages is None:
+            if len(by_doc) >= top_documents:
+                continue
+            passages = by_doc[hit["key"]] = []
+        if len(passages) < passages_per_document:
+            passages.append(hit)
+
+    return [p for passages in by_doc.values() for p in passages]
+
+
+def build_corpus_context(passages) -> str:
+    parts = []
+    total = 0
+    for p in passages:
+        part = f"[{p['name']} - trang {p['page_no']}]\n{p['text']}"
+        if total + len(part) > MAX_CONTEXT_CHARS and parts:
+            break
+        parts.append(part)
+        total += len(part)
+    return "\n\n---\n\n".join(parts)
+
+
+def format_sources(passages) -> str:
+    seen = []
+    for p in passages:
+        source = f"{p['name']} (trang {p['page_no']})"
+        if source not in seen:
+            seen.append(source)
+    return "; ".join(seen)
+
+
+def answer_corpus_question(question: str):
+    # Trả về (câu trả lời, danh sách đoạn đã dùng)
+    started = time.perf_counter()
+    usage = {}
+    passages = []
+    error = None
+    try:
+        with collect_stages() as stages:
+            passages = retrieve(question)
+            if not passages:
+                return "Không tìm thấy tài liệu nào liên quan trong kho.", []
+            return chat_with_ollama(build_corpus_context(passages), question, usage=usage), passages
+    except Exception as e:
+        error = error_text(e)
+        raise
+    finally:
+        log_question(question, started, stages, usage, error=error, passages=len(passages))
+
+
+def stream_corpus_answer(question: str):
+    started = time.perf_counter()
+    usage = {}
+    passages = []
+    error = None
+    stages = {}
+    try:
+        # Không có yield bên trong -> collect_stages an toàn trong generator
+        with collect_stages() as found:
+            passages = retrieve(question)
+        stages.update(found)
+        if not passages:
+            yield "Không tìm thấy tài liệu nào liên quan trong kho."
+            return
+        yield from timed_stream(
+            "stream_chat_with_ollama",
+            stream_chat_with_ollama(build_corpus_context(passages), question, usage=usage),
+            stages=stages,
+        )
+        yield f"\n\nNguồn: {format_sources(passages)}"
+    except Exception as e:
+        error = error_text(e)
+        raise
+    finally:
+        log_question(question, started, stages, usage, error=error, passages=len(passages))
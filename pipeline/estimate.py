@@ -0,0 +1,83 @@
+import os
+import re
+from pathlib import Path
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # Không có pypdfium2 -> đếm trang thô trong file PDF
+    pdfium = None
+
+try:
+    from PIL import Image
+except ImportError:  # Không có Pillow -> coi ảnh như 1 trang chuẩn
+    Image = None
+
+# ============================
+# ƯỚC LƯỢNG CHI PHÍ JOB OCR
+# ============================
+#
+# Trước khi xếp hàng OCR, ước lượng số trang và tổng diện tích điểm ảnh
+# (megapixel ở độ phân giải chandra render) để bộ điều phối chạy job ngắn
+# trước. Chỉ đọc header / cấu trúc trang, không render.
+
+OCR_RENDER_DPI = int(os.environ.get("OCR_RENDER_DPI", "150"))
+# Trang A4 (595 x 842 point) khi không đọc được kích thước thật
+DEFAULT_PAGE_POINTS = (595, 842)
+PAGE_OBJECT_RE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+SCAN_CHUNK = 1024 * 1024
+
+
+def _points_to_mp(width: float, height: float) -> float:
+    scale = OCR_RENDER_DPI / 72
+    return width * scale * height * scale / 1e6
+
+
+def _count_pdf_pages(path: Path) -> int:
+    # Đếm "/Type /Page" theo từng khối; PDF nén object stream có thể đếm
+    # thiếu -> tối thiểu 1 trang
+    count = 0
+    tail = b""
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(SCAN_CHUNK), b""):
+            window = tail + chunk
+            matches = list(PAGE_OBJECT_RE.finditer(window))
+            # Kết quả khớp nằm trọn trong phần tail đã được đếm ở khối trước
+            count += sum(1 for m in matches if m.end() > len(tail))
+            tail = window[-32:]
+    return max(1, count)
+
+
+def _pdf_pages(path: Path):
+    # ([(rộng, cao)] theo point của từng trang, số trang có chính xác không)
+    if pdfium is None:
+        return [DEFAULT_PAGE_POINTS] * _count_pdf_pages(path), False
+    pdf = pdfium.PdfDocument(str(path))
+    try:
+        return [pdf.get_page_size(i) for i in range(len(pdf))], True
+    finally:
+        pdf.close()
+
+
+def estimate_ocr_job(input_file: Path) -> dict:
+    # {"pages", "megapixels", "exact"}; exact=False khi chỉ đoán số trang
+    # (không dùng để chia job theo trang). File không đọc được -> 1 trang A4
+    input_file = Path(input_file)
+    try:
+        if input_file.suffix.lower() == ".pdf":
+            sizes, exact = _pdf_pages(input_file)
+            return {
+                "pages": len(sizes),
+                "megapixels": sum(_points_to_mp(w, h) for w, h in sizes),
+                "exact": exact,
+            }
+        if Image is not None:
+            with Image.open(input_file) as im:
+                n_frames = getattr(im, "n_frames", 1)
+                return {
+                    "pages": n_frames,
+                    "megapixels": im.width * im.height * n_frames / 1e6,
+                    "exact": True,
+                }
+    except Exception:
+        pass
+    return {"pages": 1, "megapixels": _points_to_mp(*DEFAULT_PAGE_POINTS), "exact": False}
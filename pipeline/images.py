@@ -0,0 +1,92 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+try:
+    from PIL import Image
+except ImportError:  # Không có Pillow -> dùng ảnh gốc làm thumbnail
+    Image = None
+
+# ============================
+# KHO ẢNH TRÊN ĐĨA (CONTENT-ADDRESSED)
+# ============================
+#
+# Ảnh OCR được ghi 1 lần vào thư mục chung, đặt tên theo sha256 nội dung.
+# Session chỉ giữ tham chiếu (dict nhỏ), không giữ bytes trong bộ nhớ.
+# Đường dẫn ảnh được lưu trong kho tài liệu (documents.db) nên thư mục phải
+# bền như DB: mặc định nằm cạnh documents.db, không nằm trong /tmp.
+
+IMAGE_STORE_DIR = Path(
+    os.environ.get(
+        "OCR_IMAGE_STORE",
+        Path(__file__).resolve().parent.parent / "image_store",
+    )
+)
+THUMBNAIL_SIZE = (360, 360)
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _atomic_copy(src: Path, dest: Path):
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dest.parent, suffix=".part")
+    os.close(fd)
+    try:
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dest)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def make_thumbnail(path: Path, digest: str) -> Path:
+    if Image is None:
+        return path
+
+    thumb = IMAGE_STORE_DIR / "thumbs" / digest[:2] / f"{digest}.webp"
+    if thumb.exists():
+        return thumb
+
+    thumb.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=thumb.parent, suffix=".part")
+    os.close(fd)
+    try:
+        with Image.open(path) as im:
+            im.thumbnail(THUMBNAIL_SIZE)
+            if im.mode not in ("RGB", "RGBA"):
+                im = im.convert("RGBA")
+            im.save(tmp, format="WEBP", quality=80)
+        os.replace(tmp, thumb)
+    except Exception:
+        Path(tmp).unlink(missing_ok=True)
+        # Ảnh hỏng / định dạng lạ -> hiển thị ảnh gốc
+        return path
+    return thumb
+
+
+def store_image(file: Path) -> dict:
+    digest = file_digest(file)
+    dest = IMAGE_STORE_DIR / digest[:2] / f"{digest}{file.suffix.lower()}"
+
+    if not dest.exists():
+        _atomic_copy(file, dest)
+
+    return {
+        "name": file.name,
+        "digest": digest,
+        "path": str(dest),
+        "thumb": str(make_thumbnail(dest, digest)),
+    }
+
+
+def load_image(ref: dict) -> bytes:
+    return Path(ref["path"]).read_bytes()
@@ -0,0 +1,277 @@
+import bisect
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+from pipeline.admission import admission
+from pipeline.cache import registry
+from pipeline.requestlog import request_log
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # Không có OpenTelemetry -> chỉ xuất Prometheus
+    otel_trace = None
+
+# ============================
+# ĐO THỜI GIAN TỪNG GIAI ĐOẠN (PROMETHEUS / OPENTELEMETRY)
+# ============================
+#
+# Mỗi giai đoạn (ghi file, chandra, đọc output, parse bảng, dựng ngữ cảnh,
+# Ollama) được bọc trong span(...). Thời gian được gom vào histogram theo
+# nhãn stage / size / pages và xuất ở dạng text của Prometheus. Nếu cài
+# opentelemetry thì mỗi span cũng là 1 span OTel.
+
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9464") or 0)
+# /metrics không có xác thực -> mặc định chỉ nghe trên máy local; đặt
+# METRICS_HOST=0.0.0.0 khi Prometheus scrape từ máy khác (sau firewall)
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+SIZE_BUCKETS = ((1 << 20, "<1MB"), (10 << 20, "1-10MB"), (50 << 20, "10-50MB"))
+PAGE_BUCKETS = ((1, "1"), (10, "2-10"), (50, "11-50"), (200, "51-200"))
+
+# Vòng đệm các lần đo gần nhất cho trang quản trị (không cần Prometheus)
+RECENT_EVENTS = int(os.environ.get("METRICS_RECENT_EVENTS", "20000"))
+
+_tracer = otel_trace.get_tracer("chatwithdocument.pipeline") if otel_trace else None
+
+
+def size_bucket(size_bytes) -> str:
+    # Gom nhãn thành vài nhóm để số chuỗi thời gian không tăng vô hạn
+    if size_bytes is None:
+        return ""
+    for limit, label in SIZE_BUCKETS:
+        if size_bytes < limit:
+            return label
+    return ">50MB"
+
+
+def pages_bucket(pages) -> str:
+    if pages is None:
+        return ""
+    for limit, label in PAGE_BUCKETS:
+        if pages <= limit:
+            return label
+    return ">200"
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # (stage, size, pages) -> [đếm theo bucket..., +Inf], tổng, số lần
+        self._series = {}
+
+    def observe(self, labels: tuple, seconds: float):
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+
+
+stage_seconds = Histogram()
+# (thời điểm, stage, giây); deque.append an toàn giữa các thread
+recent_events = deque(maxlen=RECENT_EVENTS)
+_current_trace = contextvars.ContextVar("metrics_trace", default=None)
+_current_stages = contextvars.ContextVar("metrics_stages", default=None)
+
+
+def observe(stage: str, seconds: float, size_bytes=None, pages=None):
+    stage_seconds.observe((stage, size_bucket(size_bytes), pages_bucket(pages)), seconds)
+    recent_events.append((time.time(), stage, seconds))
+
+
+def recent_durations(stages, window_seconds: float = None) -> list:
+    # Thời gian (giây) các lần đo gần đây của các stage, tăng dần
+    since = time.time() - window_seconds if window_seconds else 0
+    return sorted(s for t, stage, s in list(recent_events) if stage in stages and t >= since)
+
+
+def percentile(sorted_values, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    i = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[i]
+
+
+def _add_stage(stages, stage: str, seconds: float):
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+def record(stage: str, seconds: float, **labels):
+    _add_stage(_current_stages.get(), stage, seconds)
+    # Đang trong trace(...) -> chờ tới cuối trace mới ghi (lúc đó mới biết số trang)
+    active = _current_trace.get()
+    if active is not None:
+        active.append((stage, seconds))
+    else:
+        observe(stage, seconds, **labels)
+
+
+@contextmanager
+def span(stage: str, **labels):
+    start = time.perf_counter()
+    otel = (
+        _tracer.start_as_current_span(
+            stage, attributes={k: v for k, v in labels.items() if v is not None}
+        )
+        if _tracer else nullcontext()
+    )
+    with otel:
+        try:
+            yield
+        finally:
+            record(stage, time.perf_counter() - start, **labels)
+
+
+@contextmanager
+def trace(**labels):
+    # Gom các span bên trong; nhãn (size_bytes, pages) có thể bổ sung qua
+    # dict được yield trước khi khối lệnh kết thúc.
+    # Không dùng trong generator (context bị chia sẻ với nơi gọi).
+    spans = []
+    token = _current_trace.set(spans)
+    try:
+        yield labels
+    finally:
+        _current_trace.reset(token)
+        for stage, seconds in spans:
+            observe(stage, seconds, **labels)
+
+
+@contextmanager
+def collect_stages():
+    # Cộng dồn thời gian các span bên trong theo stage (cho nhật ký truy vấn).
+    # Cũng như trace(), không dùng trong generator.
+    stages = {}
+    token = _current_stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _current_stages.reset(token)
+
+
+def timed_stream(stage: str, chunks, stages: dict = None, **labels):
+    # Bọc generator stream (Ollama): ghi thời gian tới đoạn đầu tiên và tổng.
+    # Generator có thể được đọc từ thread khác -> cộng vào `stages` truyền vào
+    # thay vì collect_stages()
+    start = time.perf_counter()
+    first = True
+    for chunk in chunks:
+        if first:
+            seconds = time.perf_counter() - start
+            observe(f"{stage}_first_chunk", seconds, **labels)
+            _add_stage(stages, f"{stage}_first_chunk", seconds)
+            first = False
+        yield chunk
+    seconds = time.perf_counter() - start
+    observe(stage, seconds, **labels)
+    _add_stage(stages, stage, seconds)
+
+
+# ============================
+# XUẤT DẠNG TEXT PROMETHEUS
+# ============================
+
+def _labels(**labels) -> str:
+    parts = []
+    for k, v in labels.items():
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"')
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def render_prometheus() -> str:
+    name = "pipeline_stage_duration_seconds"
+    lines = [
+        f"# HELP {name} Thời gian từng giai đoạn pipeline",
+        f"# TYPE {name} histogram",
+    ]
+    for (stage, size, pages), (counts, total, count) in sorted(stage_seconds.snapshot().items()):
+        cumulative = 0
+        for le, n in zip([*BUCKETS, "+Inf"], counts):
+            cumulative += n
+            lines.append(
+                f"{name}_bucket{_labels(stage=stage, size=size, pages=pages, le=le)} {cumulative}"
+            )
+        lines.append(f"{name}_sum{_labels(stage=stage, size=size, pages=pages)} {total}")
+        lines.append(f"{name}_count{_labels(stage=stage, size=size, pages=pages)} {count}")
+
+    ocr = admission.stats()
+    cache = registry.stats()
+    log = request_log.stats()
+    gauges = [
+        ("ocr_jobs_active", "gauge", ocr["active"]),
+        ("ocr_jobs_waiting", "gauge", ocr["waiting"]),
+        ("ocr_jobs_admitted_total", "counter", ocr["admitted"]),
+        ("ocr_jobs_rejected_total", "counter", ocr["rejected"]),
+        ("document_cache_documents", "gauge", cache["documents"]),
+        ("document_cache_sessions", "gauge", cache["sessions"]),
+        ("document_cache_bytes", "gauge", cache["bytes"]),
+        ("document_cache_hits_total", "counter", cache["hits"]),
+        ("document_cache_misses_total", "counter", cache["misses"]),
+        ("document_cache_evictions_total", "counter", cache["evictions"]),
+        ("request_log_pending", "gauge", log["pending"]),
+        ("request_log_dropped_total", "counter", log["dropped"]),
+    ]
+    for metric, kind, value in gauges:
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# ============================
+# /metrics CHO APP STREAMLIT
+# ============================
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST):
+    # Streamlit chạy lại script mỗi lần tương tác -> chỉ mở server 1 lần / process
+    global _server
+    if not port:
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    with _server_lock:
+        if _server is not None:
+            return _server or None
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        try:
+            _server = ThreadingHTTPServer((host, port), Handler)
+        except OSError:
+            # Cổng đã có process khác dùng (nhiều worker) -> bỏ qua, không thử lại
+            _server = False
+            return None
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+        return _server
@@ -0,0 +1,89 @@
+import json
+
+from pipeline import config
+from pipeline.metrics import span
+
+# ============================
+# GỌI OLLAMA (TEXT ONLY)
+# ============================
+
+def _chat_payload(context: str, question: str, stream: bool) -> dict:
+    return {
+        "model": config.MODEL_NAME,
+        "messages": [
+            {
+                "role": "system",
+                "content": (
+                    "You are an assistant that answers questions strictly "
+                    "based on the following document content:\n\n"
+                    f"{context}"
+                )
+            },
+            {
+                "role": "user",
+                "content": question
+            }
+        ],
+        "stream": stream
+    }
+
+
+USAGE_FIELDS = ("prompt_eval_count", "eval_count")
+
+
+def _record_usage(usage, body: dict):
+    # Số token prompt / trả lời Ollama trả về ở cuối câu trả lời
+    if usage is not None:
+        usage.update({k: body[k] for k in USAGE_FIELDS if k in body})
+
+
+def chat_with_ollama(context: str, question: str, usage: dict = None) -> str:
+    import requests  # nạp lười: chỉ cần khi thật sự hỏi LLM
+
+    payload = _chat_payload(context, question, stream=False)
+
+    with span("chat_with_ollama"):
+        r = requests.post(config.OLLAMA_URL, json=payload, timeout=config.OLLAMA_TIMEOUT)
+    r.raise_for_status()
+    body = r.json()
+    _record_usage(usage, body)
+    return body["message"]["content"]
+
+
+def stream_chat_with_ollama(context: str, question: str, usage: dict = None):
+    # Ollama stream trả về từng dòng JSON, mỗi dòng 1 đoạn câu trả lời
+    import requests
+
+    payload = _chat_payload(context, question, stream=True)
+
+    with requests.post(
+        config.OLLAMA_URL, json=payload, timeout=config.OLLAMA_TIMEOUT, stream=True
+    ) as r:
+        r.raise_for_status()
+        for line in r.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            content = chunk.get("message", {}).get("content")
+            if content:
+                yield content
+            if chunk.get("done"):
+                _record_usage(usage, chunk)
+                break
+
+
+def embed_texts(texts, timeout: float = None) -> list:
+    # /api/embed nhận nhiều đoạn 1 lần, trả về danh sách vector
+    import requests
+
+    texts = list(texts)
+    vectors = []
+    for start in range(0, len(texts), config.EMBED_BATCH):
+        r = requests.post(
+            config.EMBED_URL,
+            json={"model": config.EMBED_MODEL, "input": texts[start:start + config.EMBED_BATCH]},
+            timeout=config.OLLAMA_TIMEOUT if timeout is None else timeout,
+        )
+        r.raise_for_status()
+        vectors.extend(r.json()["embeddings"])
+    return vectors
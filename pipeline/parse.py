@@ -0,0 +1,176 @@
+import os
+import re
+from pathlib import Path
+
+from pipeline.images import store_image
+from pipeline.metrics import span
+
+# ============================
+# ĐỌC OCR TEXT & HTML
+# ============================
+
+TEXT_SUFFIXES = {".md", ".txt"}
+HTML_SUFFIXES = {".html", ".htm"}
+IMAGE_SUFFIXES = {".webp", ".png", ".jpg", ".jpeg"}
+
+PAGE_BREAK_RE = re.compile(
+    r"\f|^\s*<!--\s*page[\s\-_]*(?:break|\d+)?\s*-->\s*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+# Số cuối cùng trong tên file (page_0003.md -> 3)
+PAGE_NO_RE = re.compile(r"(\d+)\D*$")
+
+TABLE_MARKER = b"<table"
+TABLE_SCAN_CHUNK = 64 * 1024
+
+
+# ----- MANIFEST OUTPUT OCR -----
+
+def _file_kind(suffix: str):
+    if suffix in TEXT_SUFFIXES:
+        return "text"
+    if suffix in HTML_SUFFIXES:
+        return "html"
+    if suffix in IMAGE_SUFFIXES:
+        return "image"
+    return None
+
+
+def _page_order(path: Path):
+    # Cùng thư mục: theo số trang trong tên (trang 2 trước trang 10), file
+    # không có số trang xếp cuối. Khác thư mục (part_00001, part_00017...):
+    # theo đường dẫn thư mục
+    page = PAGE_NO_RE.search(path.stem)
+    return (path.parent, page is None, int(page.group(1)) if page else 0, path.name)
+
+
+def scan_ocr_output(output_dir: Path) -> list:
+    # Duyệt thư mục output 1 lần (os.scandir), trả về manifest đã sắp xếp
+    # theo thứ tự trang: [{"path", "kind"}]. Chưa đọc nội dung.
+    manifest = []
+    stack = [str(output_dir)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir():
+                    stack.append(entry.path)
+                    continue
+                suffix = os.path.splitext(entry.name)[1]
+                kind = _file_kind(suffix.lower())
+                if kind is None:
+                    continue
+                manifest.append({"path": Path(entry.path), "kind": kind})
+    manifest.sort(key=lambda e: _page_order(e["path"]))
+    return manifest
+
+
+def contains_table(path: Path) -> bool:
+    # Đọc từng khối và dừng ở "<table" đầu tiên, không nạp / lower cả file
+    tail = b""
+    keep = len(TABLE_MARKER) - 1
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(TABLE_SCAN_CHUNK), b""):
+            window = tail + chunk.lower()
+            if TABLE_MARKER in window:
+                return True
+            tail = window[-keep:]
+    return False
+
+
+def read_ocr_blocks(output_dir: Path, manifest=None):
+    if manifest is None:
+        manifest = scan_ocr_output(output_dir)
+
+    text_blocks = []
+    html_tables = []
+
+    for entry in manifest:
+        if entry["kind"] == "text":
+            text_blocks.append(
+                entry["path"].read_text(encoding="utf-8", errors="ignore")
+            )
+        elif entry["kind"] == "html" and contains_table(entry["path"]):
+            html_tables.append(
+                entry["path"].read_text(encoding="utf-8", errors="ignore")
+            )
+
+    return text_blocks, html_tables
+
+
+def read_ocr_text_and_tables(output_dir: Path, manifest=None):
+    text_blocks, html_tables = read_ocr_blocks(output_dir, manifest)
+    return "\n\n".join(text_blocks), html_tables
+
+
+def split_pages(text_blocks) -> list:
+    # Mỗi file .md của chandra là 1 trang; nếu trong file có dấu ngắt
+    # trang (\f hoặc <!-- page N -->) thì tách tiếp theo dấu đó.
+    pages = []
+    for block in text_blocks:
+        for part in PAGE_BREAK_RE.split(block):
+            if part.strip():
+                pages.append(part.strip())
+    return pages
+
+
+def chunk_pages(pages, max_chars: int = 1200) -> list:
+    # Cắt mỗi trang thành các đoạn ~max_chars theo ranh giới đoạn văn,
+    # trả về [(số trang, đoạn)] để đánh chỉ mục tìm kiếm
+    chunks = []
+    for page_no, page in enumerate(pages, 1):
+        current = ""
+        for para in re.split(r"\n\s*\n", page):
+            para = para.strip()
+            if not para:
+                continue
+            if current and len(current) + len(para) + 2 > max_chars:
+                chunks.append((page_no, current))
+                current = ""
+            while len(para) > max_chars:
+                chunks.append((page_no, para[:max_chars]))
+                para = para[max_chars:]
+            current = f"{current}\n\n{para}" if current else para
+        if current:
+            chunks.append((page_no, current))
+    return chunks
+
+
+# ============================
+# HTML TABLE → TEXT
+# ============================
+
+def table_html_to_text(html: str) -> str:
+    from bs4 import BeautifulSoup  # nạp lười, bs4 khá nặng
+
+    soup = BeautifulSoup(html, "html.parser")
+
+    lines = []
+    for row in soup.find_all("tr"):
+        cells = row.find_all(["th", "td"])
+        values = [c.get_text(" ", strip=True) for c in cells]
+        if any(values):
+            lines.append(" | ".join(values))
+
+    return "\n".join(lines)
+
+
+def build_llm_context(text: str, tables_html) -> str:
+    # Dựng 1 lần sau OCR, không parse lại bảng ở mỗi câu hỏi
+    with span("table_html_to_text"):
+        table_text = "\n\n".join(table_html_to_text(t) for t in tables_html)
+    return text + "\n\n" + table_text
+
+
+# ============================
+# ĐỌC ẢNH OCR
+# ============================
+
+def read_ocr_images(output_dir: Path, manifest=None):
+    # Ghi ảnh vào kho trên đĩa, chỉ trả về tham chiếu + thumbnail
+    if manifest is None:
+        manifest = scan_ocr_output(output_dir)
+    return [store_image(e["path"]) for e in manifest if e["kind"] == "image"]
@@ -0,0 +1,280 @@
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from pipeline import config
+from pipeline.cache import registry
+from pipeline.core import content_hash, open_document
+from pipeline.corpus import build_corpus_context, retrieve
+from pipeline.metrics import percentile
+from pipeline.ollama import chat_with_ollama
+from pipeline.requestlog import request_log
+from pipeline.store import get_store
+from pipeline.tables import answer_table_question
+
+# ============================
+# PHÁT LẠI TRUY VẤN / KIỂM TRA TẢI
+# ============================
+#
+# Đọc file JSONL, mỗi dòng 1 cặp (tài liệu, câu hỏi), chạy qua pipeline
+# thật (cache tài liệu / SQLite / OCR, tìm đoạn, LLM) và đo từng giai đoạn:
+#
+#   python -m pipeline.replay traffic.jsonl --concurrency 8
+#   python -m pipeline.replay traffic.jsonl --rate 2.5 --fake-llm
+#
+# Mỗi dòng: {"question": "...", "document": "đường dẫn file"} hoặc
+# {"question": "...", "doc_hash": "<sha256>"} (tài liệu đã có trong kho),
+# không có tài liệu = hỏi trên toàn kho. --fake-llm thay Ollama bằng
+# server giả cục bộ để đo phần còn lại mà không phụ thuộc GPU.
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def load_records(path: Path) -> list:
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get("question"):
+                records.append(record)
+    return records
+
+
+# ----- LLM GIẢ -----
+
+def start_fake_ollama(latency: float = 0.5, tokens: int = 50, port: int = 0):
+    # Giả lập /api/chat của Ollama (có và không stream)
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, body: dict):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+
+            prompt_chars = sum(len(m.get("content", "")) for m in payload.get("messages", []))
+            stats = {"prompt_eval_count": prompt_chars // 4, "eval_count": tokens}
+            if not payload.get("stream"):
+                time.sleep(latency)
+                self._send_json({
+                    "message": {"role": "assistant", "content": "ok " * tokens},
+                    "done": True,
+                    **stats,
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            for _ in range(tokens):
+                time.sleep(latency / tokens)
+                line = {"message": {"content": "ok "}, "done": False}
+                self.wfile.write((json.dumps(line) + "\n").encode("utf-8"))
+            self.wfile.write((json.dumps({"done": True, **stats}) + "\n").encode("utf-8"))
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-ollama", daemon=True).start()
+    return server
+
+
+# ----- CHẠY 1 TRUY VẤN -----
+
+def replay_one(record: dict) -> dict:
+    # Trả về thời gian (giây) từng giai đoạn + thông tin cache
+    timings = {}
+    result = {"timings": timings, "cache": None, "error": None}
+    start = time.perf_counter()
+
+    try:
+        document = record.get("document")
+        key = record.get("doc_hash")
+        handle = None
+
+        if document or key:
+            t = time.perf_counter()
+            if document:
+                key = key or content_hash(Path(document))
+            if key in registry:
+                result["cache"] = "memory"
+            elif get_store().has_document(key):
+                result["cache"] = "store"
+            else:
+                result["cache"] = "miss"
+            if document:
+                handle = open_document(Path(document), Path(document).name, key=key)
+            elif result["cache"] != "miss":
+                handle = open_document(b"", key=key)
+            else:
+                raise LookupError(f"Không có tài liệu {key} trong kho")
+            timings["document"] = time.perf_counter() - t
+
+        try:
+            question = record["question"]
+            t = time.perf_counter()
+            if handle is not None:
+                doc = handle.data
+                answer = answer_table_question(question, doc["tables"])
+                context = doc["llm_context"]
+                timings["retrieval"] = time.perf_counter() - t
+            else:
+                answer = None
+                context = build_corpus_context(retrieve(question))
+                timings["retrieval"] = time.perf_counter() - t
+
+            if not answer:
+                t = time.perf_counter()
+                chat_with_ollama(context, question)
+                timings["llm"] = time.perf_counter() - t
+        finally:
+            if handle is not None:
+                handle.release()
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    timings["total"] = time.perf_counter() - start
+    return result
+
+
+# ----- ĐIỀU PHỐI TẢI -----
+
+def run_replay(records, concurrency: int = 4, rate: float = None, seed: int = 0) -> dict:
+    # rate=None: vòng kín, luôn có `concurrency` truy vấn đang chạy.
+    # rate=R: vòng mở, truy vấn đến theo Poisson R/s bất kể hệ thống nhanh hay chậm;
+    # thời gian chờ trong pool được tính vào "queue".
+    rng = random.Random(seed)
+    results = []
+    lock = threading.Lock()
+
+    def run(record, arrival):
+        queued = time.perf_counter() - arrival
+        result = replay_one(record)
+        result["timings"]["queue"] = queued
+        with lock:
+            results.append(result)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        next_arrival = start
+        for record in records:
+            if rate:
+                next_arrival += rng.expovariate(rate)
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(run, record, time.perf_counter())
+    wall = time.perf_counter() - start
+
+    return summarize(results, wall)
+
+
+def summarize(results, wall: float) -> dict:
+    # Chỉ tính thời gian của truy vấn thành công, lỗi đếm riêng
+    stages = {}
+    for r in results:
+        if r["error"]:
+            continue
+        for stage, seconds in r["timings"].items():
+            stages.setdefault(stage, []).append(seconds)
+
+    summary = {
+        "requests": len(results),
+        "errors": sum(1 for r in results if r["error"]),
+        "wall_seconds": wall,
+        "throughput_rps": len(results) / wall if wall else 0.0,
+        "cache": {},
+        "stages": {},
+    }
+    for r in results:
+        if r["cache"]:
+            summary["cache"][r["cache"]] = summary["cache"].get(r["cache"], 0) + 1
+    for stage, values in stages.items():
+        values.sort()
+        summary["stages"][stage] = {
+            "count": len(values),
+            "mean_ms": sum(values) / len(values) * 1000,
+            **{f"p{p}_ms": percentile(values, p) * 1000 for p in PERCENTILES},
+            "max_ms": values[-1] * 1000,
+        }
+    summary["sample_errors"] = [r["error"] for r in results if r["error"]][:5]
+    return summary
+
+
+def print_summary(summary: dict):
+    print(
+        f"{summary['requests']} truy vấn, {summary['errors']} lỗi, "
+        f"{summary['wall_seconds']:.1f}s, {summary['throughput_rps']:.2f} truy vấn/s"
+    )
+    if summary["cache"]:
+        print("cache tài liệu: " + ", ".join(f"{k}={v}" for k, v in summary["cache"].items()))
+    header = "giai đoạn".ljust(10) + "".join(
+        h.rjust(10) for h in ["n", "mean", *(f"p{p}" for p in PERCENTILES), "max"]
+    )
+    print(header)
+    for stage, s in summary["stages"].items():
+        cells = [s["count"], s["mean_ms"], *(s[f"p{p}_ms"] for p in PERCENTILES), s["max_ms"]]
+        print(stage.ljust(10) + f"{cells[0]:>10}" + "".join(f"{c:>8.1f}ms" for c in cells[1:]))
+    for error in summary["sample_errors"]:
+        print(f"lỗi: {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Phát lại truy vấn từ JSONL và đo độ trễ")
+    parser.add_argument("records", type=Path, help="file JSONL (document/doc_hash, question)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, help="số truy vấn/giây (vòng mở)")
+    parser.add_argument("--limit", type=int, help="chỉ chạy N dòng đầu")
+    parser.add_argument("--repeat", type=int, default=1, help="lặp lại danh sách N lần")
+    parser.add_argument("--fake-llm", action="store_true", help="dùng Ollama giả cục bộ")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-tokens", type=int, default=50)
+    parser.add_argument("--output", type=Path, help="ghi kết quả JSON để so sánh cấu hình")
+    args = parser.parse_args(argv)
+
+    records = load_records(args.records)[:args.limit] * args.repeat
+    if not records:
+        print("Không có dòng nào có câu hỏi")
+        return 1
+
+    # Truy vấn phát lại không phải tải thật -> không ghi vào nhật ký truy vấn
+    request_log.path = None
+
+    if args.fake_llm:
+        server = start_fake_ollama(args.llm_latency, args.llm_tokens)
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        config.OLLAMA_URL = base + "/api/chat"
+        # Không có embedding thật -> chỉ dùng bm25, không ghi vector rác vào chỉ mục
+        config.EMBED_MODEL = ""
+
+    summary = run_replay(records, concurrency=args.concurrency, rate=args.rate)
+    summary["config"] = {
+        "concurrency": args.concurrency,
+        "rate": args.rate,
+        "fake_llm": args.fake_llm,
+        "model": config.MODEL_NAME,
+    }
+    print_summary(summary)
+    if args.output:
+        args.output.write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from pipeline import config
+
+# ============================
+# NHẬT KÝ TRUY VẤN (JSONL)
+# ============================
+#
+# Mỗi lần mở tài liệu (OCR / cache) và mỗi câu hỏi ghi 1 dòng JSON: hash
+# tài liệu, số trang, dung lượng, thời gian từng giai đoạn, cache, model,
+# số token prompt / trả lời. Dòng câu hỏi có "question" + "doc_hash" nên
+# phát lại được bằng `python -m pipeline.replay <file>`.
+#
+# Request chỉ đẩy dict vào hàng đợi trong RAM; 1 thread nền gom lại và ghi
+# theo lô. Hàng đợi đầy (đĩa chậm / treo) -> bỏ bớt dòng, không chặn request.
+# REQUEST_LOG="" để tắt.
+
+REQUEST_LOG = os.environ.get(
+    "REQUEST_LOG",
+    str(Path(__file__).resolve().parent.parent / "logs" / "requests.jsonl"),
+)
+REQUEST_LOG_MAX_PENDING = int(os.environ.get("REQUEST_LOG_MAX_PENDING", "10000"))
+REQUEST_LOG_FLUSH_SECONDS = float(os.environ.get("REQUEST_LOG_FLUSH_SECONDS", "1"))
+# Đủ số dòng này thì ghi ngay, không chờ hết chu kỳ
+REQUEST_LOG_BATCH = 256
+
+
+class RequestLog:
+    def __init__(self, path=REQUEST_LOG, max_pending: int = REQUEST_LOG_MAX_PENDING,
+                 flush_seconds: float = REQUEST_LOG_FLUSH_SECONDS):
+        self.path = Path(path) if path else None
+        self.max_pending = max_pending
+        self.flush_seconds = flush_seconds
+        self._pending = deque()
+        self._lock = threading.Lock()
+        # Chỉ 1 lần ghi file tại 1 thời điểm (thread nền + atexit)
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+
+    def log(self, record: dict):
+        # Không đụng tới đĩa ở đây; record không được sửa sau khi gọi
+        if self.path is None:
+            return
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending.append(record)
+            pending = len(self._pending)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="request-log", daemon=True
+                )
+                self._thread.start()
+        if pending >= REQUEST_LOG_BATCH:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except OSError:
+                # Không ghi được (hết chỗ, sai quyền) -> thử lại ở chu kỳ sau
+                pass
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                records = list(self._pending)
+                self._pending.clear()
+            if not records or self.path is None:
+                return
+            lines = "".join(
+                json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in records
+            )
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+            except OSError:
+                with self._lock:
+                    # Trả lại hàng đợi (trong giới hạn) để lần sau ghi tiếp
+                    room = max(0, self.max_pending - len(self._pending))
+                    self._pending.extendleft(reversed(records[:room]))
+                    self.dropped += len(records) - room
+                raise
+            self.written += len(records)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "written": self.written,
+                "dropped": self.dropped,
+            }
+
+
+request_log = RequestLog()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        request_log.flush()
+    except OSError:
+        pass
+
+
+def error_text(e: BaseException) -> str:
+    return f"{type(e).__name__}: {e}"
+
+
+def log_request(kind: str, stages: dict = None, **fields):
+    # Thời gian giai đoạn tính bằng giây, làm tròn cho file gọn
+    record = {"ts": round(time.time(), 3), "kind": kind, **fields}
+    if stages is not None:
+        record["stages"] = {k: round(v, 4) for k, v in stages.items()}
+    request_log.log(record)
+
+
+def log_question(question: str, started: float, stages: dict, usage: dict,
+                 error: str = None, **fields):
+    # started: time.perf_counter() lúc nhận câu hỏi
+    log_request(
+        "question",
+        stages=stages,
+        question=question,
+        **fields,
+        model=config.MODEL_NAME,
+        **usage,
+        seconds=round(time.perf_counter() - started, 4),
+        error=error,
+    )
@@ -0,0 +1,410 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+
+from pipeline.parse import chunk_pages
+from pipeline.tables import normalize_label, parse_tables
+
+# ============================
+# KHO TÀI LIỆU SQLITE + FTS5
+# ============================
+#
+# Kết quả OCR (trang markdown, bảng, tham chiếu ảnh, metadata) được lưu lại
+# sau khi thư mục tạm bị xóa. Bảng FTS5 pages_fts cho phép tìm từ khóa trên
+# mọi tài liệu đã xử lý. Ghi theo lô trong 1 transaction.
+
+DOCUMENT_DB = Path(
+    os.environ.get(
+        "DOCUMENT_DB",
+        Path(__file__).resolve().parent.parent / "documents.db",
+    )
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL DEFAULT '',
+    bytes INTEGER NOT NULL DEFAULT 0,
+    page_count INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    meta TEXT NOT NULL DEFAULT '{}'
+);
+
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    doc_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    page_no INTEGER NOT NULL,
+    markdown TEXT NOT NULL,
+    UNIQUE (doc_id, page_no)
+);
+
+CREATE TABLE IF NOT EXISTS tables (
+    id INTEGER PRIMARY KEY,
+    doc_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    table_no INTEGER NOT NULL,
+    html TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    doc_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    path TEXT NOT NULL,
+    thumb TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    doc_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    page_no INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS tables_doc ON tables(doc_id);
+CREATE INDEX IF NOT EXISTS chunks_doc ON chunks(doc_id);
+CREATE INDEX IF NOT EXISTS images_doc ON images(doc_id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(
+    markdown,
+    content='pages',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+    text,
+    content='chunks',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_vocab USING fts5vocab(chunks_fts, 'row');
+"""
+
+# Từ xuất hiện trong quá nhiều đoạn (vd "nghị định", "năm") gần như không
+# giúp xếp hạng mà làm truy vấn OR phải chấm điểm cả kho -> bỏ qua
+COMMON_TERM_RATIO = 0.05
+COMMON_TERM_MIN_CHUNKS = 2000
+
+# Từ phổ biến trong câu hỏi, bỏ đi để truy vấn OR không quét cả kho
+STOPWORDS = {
+    "la", "cua", "va", "cac", "nhung", "co", "khong", "nao", "gi", "bao",
+    "nhieu", "trong", "cho", "ve", "duoc", "nay", "do", "mot", "voi", "thi",
+    "tai", "tu", "den", "theo", "nhu", "the", "hay", "hoac", "da", "se",
+    "what", "which", "a", "an", "of", "in", "on", "is", "are", "and",
+}
+
+
+def fts_query(text: str, any_term: bool = False) -> str:
+    # Mỗi từ thành 1 chuỗi trong ngoặc kép -> không bị hiểu là cú pháp FTS5
+    terms = [t.replace('"', '""') for t in text.split()]
+    joiner = " OR " if any_term else " "
+    return joiner.join(f'"{t}"' for t in terms if t)
+
+
+def fold_term(word: str) -> str:
+    # Giống tokenizer unicode61 remove_diacritics: bỏ dấu, giữ nguyên "đ"
+    word = unicodedata.normalize("NFKD", word.lower())
+    return "".join(c for c in word if not unicodedata.combining(c))
+
+
+def question_terms(question: str) -> list:
+    terms = []
+    for word in re.findall(r"\w+", question):
+        term = fold_term(word)
+        if normalize_label(term) not in STOPWORDS and term not in terms:
+            terms.append(term)
+    return terms
+
+
+class DocumentStore:
+    def __init__(self, path: Path = DOCUMENT_DB):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+        self._backfill_chunks()
+
+    def _conn(self) -> sqlite3.Connection:
+        # 1 kết nối / thread; WAL cho phép đọc song song khi đang ghi
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    # ----- GHI -----
+
+    def _insert(self, conn, doc: dict, meta: dict = None) -> int:
+        cur = conn.execute(
+            "INSERT INTO documents (key, name, bytes, page_count, created_at, meta) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(key) DO NOTHING",
+            (
+                doc["key"],
+                doc.get("name", ""),
+                doc.get("bytes", 0),
+                len(doc["pages"]),
+                time.time(),
+                json.dumps(meta or {}, ensure_ascii=False),
+            ),
+        )
+        if cur.rowcount == 0:
+            # Đã lưu trước đó (cùng hash nội dung)
+            return conn.execute(
+                "SELECT id FROM documents WHERE key = ?", (doc["key"],)
+            ).fetchone()[0]
+
+        doc_id = cur.lastrowid
+        conn.executemany(
+            "INSERT INTO pages (doc_id, page_no, markdown) VALUES (?, ?, ?)",
+            [(doc_id, i + 1, page) for i, page in enumerate(doc["pages"])],
+        )
+        conn.execute(
+            "INSERT INTO pages_fts (rowid, markdown) "
+            "SELECT id, markdown FROM pages WHERE doc_id = ?",
+            (doc_id,),
+        )
+        self._insert_chunks(conn, doc_id, doc["pages"])
+        conn.executemany(
+            "INSERT INTO tables (doc_id, table_no, html) VALUES (?, ?, ?)",
+            [(doc_id, i + 1, html) for i, html in enumerate(doc["tables_html"])],
+        )
+        conn.executemany(
+            "INSERT INTO images (doc_id, name, digest, path, thumb) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (doc_id, img["name"], img["digest"], img["path"], img["thumb"])
+                for img in doc["images"]
+            ],
+        )
+        return doc_id
+
+    def _insert_chunks(self, conn, doc_id: int, pages):
+        conn.executemany(
+            "INSERT INTO chunks (doc_id, page_no, text) VALUES (?, ?, ?)",
+            [(doc_id, page_no, text) for page_no, text in chunk_pages(pages)],
+        )
+        conn.execute(
+            "INSERT INTO chunks_fts (rowid, text) "
+            "SELECT id, text FROM chunks WHERE doc_id = ?",
+            (doc_id,),
+        )
+
+    def _backfill_chunks(self):
+        # Tài liệu lưu trước khi có bảng chunks -> tạo chunk 1 lần
+        conn = self._conn()
+        missing = [
+            r[0] for r in conn.execute(
+                "SELECT id FROM documents d WHERE NOT EXISTS "
+                "(SELECT 1 FROM chunks c WHERE c.doc_id = d.id) AND page_count > 0"
+            )
+        ]
+        if not missing:
+            return
+        with self._write_lock, conn:
+            for doc_id in missing:
+                pages = [
+                    r[0] for r in conn.execute(
+                        "SELECT markdown FROM pages WHERE doc_id = ? ORDER BY page_no",
+                        (doc_id,),
+                    )
+                ]
+                self._insert_chunks(conn, doc_id, pages)
+
+    def save_documents(self, docs, meta: dict = None) -> list:
+        # Cả lô trong 1 transaction: nhanh hơn nhiều so với commit từng dòng
+        conn = self._conn()
+        with self._write_lock, conn:
+            return [self._insert(conn, doc, meta) for doc in docs]
+
+    def save_document(self, doc: dict, meta: dict = None) -> int:
+        return self.save_documents([doc], meta)[0]
+
+    def delete_document(self, key: str):
+        conn = self._conn()
+        with self._write_lock, conn:
+            row = conn.execute(
+                "SELECT id FROM documents WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return
+            conn.execute(
+                "INSERT INTO pages_fts (pages_fts, rowid, markdown) "
+                "SELECT 'delete', id, markdown FROM pages WHERE doc_id = ?",
+                (row[0],),
+            )
+            conn.execute(
+                "INSERT INTO chunks_fts (chunks_fts, rowid, text) "
+                "SELECT 'delete', id, text FROM chunks WHERE doc_id = ?",
+                (row[0],),
+            )
+            conn.execute("DELETE FROM documents WHERE id = ?", (row[0],))
+
+    # ----- ĐỌC -----
+
+    def has_document(self, key: str) -> bool:
+        row = self._conn().execute(
+            "SELECT 1 FROM documents WHERE key = ?", (key,)
+        ).fetchone()
+        return row is not None
+
+    def load_document(self, key: str):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT id, key, name, bytes FROM documents WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        pages = [
+            r[0] for r in conn.execute(
+                "SELECT markdown FROM pages WHERE doc_id = ? ORDER BY page_no",
+                (row["id"],),
+            )
+        ]
+        tables_html = [
+            r[0] for r in conn.execute(
+                "SELECT html FROM tables WHERE doc_id = ? ORDER BY table_no",
+                (row["id"],),
+            )
+        ]
+        images = []
+        for r in conn.execute(
+            "SELECT name, digest, path, thumb FROM images "
+            "WHERE doc_id = ? ORDER BY id",
+            (row["id"],),
+        ):
+            image = dict(r)
+            # File ảnh bị xóa (kho ảnh cũ trong /tmp, dọn đĩa) -> bỏ ảnh đó;
+            # mất thumbnail thì hiển thị ảnh gốc
+            if not Path(image["path"]).exists():
+                continue
+            if not Path(image["thumb"]).exists():
+                image["thumb"] = image["path"]
+            images.append(image)
+
+        return {
+            "key": row["key"],
+            "name": row["name"],
+            "bytes": row["bytes"],
+            "text": "\n\n".join(pages),
+            "pages": pages,
+            "tables_html": tables_html,
+            "tables": parse_tables(tables_html),
+            "images": images,
+            "llm_context": "",
+        }
+
+    def list_documents(self, limit: int = 100) -> list:
+        return [
+            dict(r) for r in self._conn().execute(
+                "SELECT key, name, bytes, page_count, created_at FROM documents "
+                "ORDER BY created_at DESC LIMIT ?",
+                (limit,),
+            )
+        ]
+
+    def search(self, query: str, limit: int = 20) -> list:
+        match = fts_query(query)
+        if not match:
+            return []
+        rows = self._conn().execute(
+            "SELECT d.key, d.name, p.page_no, "
+            "       snippet(pages_fts, 0, '**', '**', ' … ', 16) AS snippet, "
+            "       bm25(pages_fts) AS score "
+            "FROM pages_fts "
+            "JOIN pages p ON p.id = pages_fts.rowid "
+            "JOIN documents d ON d.id = p.doc_id "
+            "WHERE pages_fts MATCH ? "
+            "ORDER BY score LIMIT ?",
+            (match, limit),
+        )
+        return [dict(r) for r in rows]
+
+    def _selective_terms(self, terms) -> list:
+        conn = self._conn()
+        placeholders = ",".join("?" * len(terms))
+        df = dict(conn.execute(
+            f"SELECT term, doc FROM chunks_vocab WHERE term IN ({placeholders})",
+            terms,
+        ).fetchall())
+        total = conn.execute("SELECT max(id) FROM chunks").fetchone()[0] or 0
+        limit = max(COMMON_TERM_RATIO * total, COMMON_TERM_MIN_CHUNKS)
+
+        selective = [t for t in terms if 0 < df.get(t, 0) <= limit]
+        if not selective:
+            # Chỉ toàn từ phổ biến -> dùng 2 từ hiếm nhất
+            selective = sorted((t for t in terms if t in df), key=df.get)[:2]
+        return selective
+
+    def search_chunks(self, question: str, limit: int = 50) -> list:
+        # Câu hỏi tự nhiên -> OR các từ khóa có tính phân biệt, xếp hạng bm25
+        terms = question_terms(question)
+        if not terms:
+            return []
+        match = fts_query(" ".join(self._selective_terms(terms)), any_term=True)
+        if not match:
+            return []
+
+        # Xếp hạng trên riêng bảng FTS trước, chỉ join các đoạn được chọn
+        rows = self._conn().execute(
+            "WITH ranked AS ("
+            "    SELECT rowid, bm25(chunks_fts) AS score FROM chunks_fts "
+            "    WHERE chunks_fts MATCH ? ORDER BY score LIMIT ?"
+            ") "
+            "SELECT d.key, d.name, c.page_no, c.text, ranked.score "
+            "FROM ranked "
+            "JOIN chunks c ON c.id = ranked.rowid "
+            "JOIN documents d ON d.id = c.doc_id "
+            "ORDER BY ranked.score",
+            (match, limit),
+        )
+        return [dict(r) for r in rows]
+
+    def chunks_after(self, last_id: int, limit: int = 1000) -> list:
+        # Các đoạn chưa có embedding (id tăng dần theo thứ tự lưu)
+        rows = self._conn().execute(
+            "SELECT id, text FROM chunks WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, limit),
+        )
+        return [(r["id"], r["text"]) for r in rows]
+
+    def get_chunks(self, ids) -> list:
+        # Giữ thứ tự của ids; đoạn đã bị xóa thì bỏ qua
+        ids = [int(i) for i in ids]
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        rows = self._conn().execute(
+            "SELECT c.id, d.key, d.name, c.page_no, c.text FROM chunks c "
+            f"JOIN documents d ON d.id = c.doc_id WHERE c.id IN ({placeholders})",
+            ids,
+        )
+        by_id = {r["id"]: dict(r) for r in rows}
+        return [by_id[i] for i in ids if i in by_id]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> DocumentStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = DocumentStore()
+        return _store
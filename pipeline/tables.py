@@ -0,0 +1,398 @@
+import math
+import re
+import unicodedata
+from array import array
+
+# ============================
+# BẢNG DẠNG CỘT (COLUMNAR)
+# ============================
+#
+# Mỗi bảng HTML do chandra xuất ra được giữ thành các cột có kiểu:
+# cột số -> array("d") (ô trống = NaN), cột chữ -> list[str].
+# Câu hỏi số học đơn giản ("tổng tiền ở bảng 3") được trả lời trực tiếp
+# trên các cột này, không cần gọi LLM.
+
+# So khớp trên chữ còn dấu: bỏ dấu thì "cộng" trùng "công", "bảng" trùng "bằng"
+TOTAL_ROW_WORDS = ("tổng", "cộng", "tổng cộng", "total", "sum")
+NUMERIC_RATIO = 0.8
+
+_NUMBER_RE = re.compile(r"^[+-]?[\d.,\s]*\d[\d.,\s]*$")
+_UNIT_RE = re.compile(r"(vnđ|vnd|đồng|đ|usd|\$|%)", re.IGNORECASE)
+
+
+def lower_text(text: str) -> str:
+    # Viết thường, giữ dấu tiếng Việt, bỏ dấu câu -> so khớp từ khóa
+    text = unicodedata.normalize("NFC", text).lower()
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+def normalize_label(text: str) -> str:
+    # Bỏ dấu tiếng Việt + viết thường để so khớp nhãn cột / nhãn dòng
+    text = text.replace("đ", "d").replace("Đ", "D")
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+def parse_number(text: str):
+    s = text.strip()
+    if not s:
+        return None
+
+    negative = s.startswith("(") and s.endswith(")")
+    if negative:
+        s = s[1:-1]
+
+    s = _UNIT_RE.sub("", s).strip()
+    if not _NUMBER_RE.match(s):
+        return None
+    s = s.replace(" ", "")
+
+    # "1.234.567" / "1,234,567" -> dấu phân cách hàng nghìn
+    # "1.234,5" -> kiểu Việt Nam, "1,234.5" -> kiểu Anh
+    if "," in s and "." in s:
+        if s.rfind(",") > s.rfind("."):
+            s = s.replace(".", "").replace(",", ".")
+        else:
+            s = s.replace(",", "")
+    # "0,001" / "0.001": số 0 đứng đầu -> dấu thập phân, không phải hàng nghìn
+    elif s.count(".") > 1 or re.fullmatch(r"[+-]?[1-9]\d{0,2}(\.\d{3})+", s):
+        s = s.replace(".", "")
+    elif s.count(",") > 1 or re.fullmatch(r"[+-]?[1-9]\d{0,2}(,\d{3})+", s):
+        s = s.replace(",", "")
+    else:
+        s = s.replace(",", ".")
+
+    try:
+        value = float(s)
+    except ValueError:
+        return None
+    return -value if negative else value
+
+
+def format_number(value: float) -> str:
+    if math.isnan(value):
+        return "-"
+    if value == int(value):
+        return f"{int(value):,}".replace(",", ".")
+    text = f"{value:,.2f}".rstrip("0").rstrip(".")
+    return text.replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+class Table:
+    def __init__(self, header, rows):
+        self.header = list(header)
+        self.columns = {}
+        self.numeric = set()
+
+        width = len(self.header)
+        rows = [list(r) + [""] * (width - len(r)) for r in rows]
+        self.n_rows = len(rows)
+
+        # Dòng "Tổng cộng" có thể nằm ở bất kỳ ô chữ nào (thường gộp cột STT)
+        self.total_rows = {
+            i for i, r in enumerate(rows)
+            if any(lower_text(c) in TOTAL_ROW_WORDS for c in r)
+        }
+
+        for j, name in enumerate(self.header):
+            cells = [r[j] for r in rows]
+            numbers = [parse_number(c) for c in cells]
+            filled = [
+                n for i, (c, n) in enumerate(zip(cells, numbers))
+                if c.strip() and i not in self.total_rows
+            ]
+            parsed = sum(1 for n in filled if n is not None)
+
+            if filled and parsed / len(filled) >= NUMERIC_RATIO:
+                self.columns[name] = array(
+                    "d", (math.nan if n is None else n for n in numbers)
+                )
+                self.numeric.add(name)
+            else:
+                self.columns[name] = cells
+
+        # Nhãn dòng = cột chữ đầu tiên
+        self.label_column = next(
+            (h for h in self.header if h not in self.numeric), None
+        )
+        labels = self.columns[self.label_column] if self.label_column else [""] * self.n_rows
+        self.row_labels = list(labels)
+
+    def __len__(self):
+        return self.n_rows
+
+    def column(self, label: str):
+        name = self.find_column(label)
+        if name is None:
+            raise KeyError(label)
+        return self.columns[name]
+
+    def find_column(self, label: str):
+        key = normalize_label(label)
+        for name in self.header:
+            if normalize_label(name) == key:
+                return name
+        for name in self.header:
+            if key and key in normalize_label(name):
+                return name
+        return None
+
+    def find_row(self, label: str):
+        key = normalize_label(label)
+        for i, row_label in enumerate(self.row_labels):
+            if normalize_label(row_label) == key:
+                return i
+        for i, row_label in enumerate(self.row_labels):
+            if key and key in normalize_label(row_label):
+                return i
+        return None
+
+    def rows(self):
+        for i in range(self.n_rows):
+            yield [self.columns[h][i] for h in self.header]
+
+    def filter(self, label: str, predicate):
+        # predicate: giá trị cần khớp, hoặc hàm nhận giá trị ô -> bool
+        col = self.column(label)
+        if not callable(predicate):
+            target = predicate
+            if isinstance(target, str):
+                key = normalize_label(target)
+                predicate = lambda v: isinstance(v, str) and key in normalize_label(v)
+            else:
+                predicate = lambda v: v == target
+
+        keep = [i for i in range(self.n_rows) if predicate(col[i])]
+        return self._subset(keep)
+
+    def _subset(self, indices):
+        table = Table.__new__(Table)
+        table.header = list(self.header)
+        table.numeric = set(self.numeric)
+        table.n_rows = len(indices)
+        table.columns = {}
+        for name, col in self.columns.items():
+            values = [col[i] for i in indices]
+            table.columns[name] = array("d", values) if name in self.numeric else values
+        table.label_column = self.label_column
+        table.row_labels = [self.row_labels[i] for i in indices]
+        table.total_rows = {
+            k for k, i in enumerate(indices) if i in self.total_rows
+        }
+        return table
+
+    def values(self, label: str, include_totals: bool = False):
+        name = self.find_column(label)
+        if name is None or name not in self.numeric:
+            raise KeyError(label)
+        col = self.columns[name]
+        return [
+            v for i, v in enumerate(col)
+            if not math.isnan(v) and (include_totals or i not in self.total_rows)
+        ]
+
+    def sum(self, label: str) -> float:
+        return math.fsum(self.values(label))
+
+    def mean(self, label: str) -> float:
+        values = self.values(label)
+        return math.fsum(values) / len(values) if values else math.nan
+
+    def max(self, label: str) -> float:
+        values = self.values(label)
+        return max(values) if values else math.nan
+
+    def min(self, label: str) -> float:
+        values = self.values(label)
+        return min(values) if values else math.nan
+
+    def lookup(self, row_label: str, column_label: str):
+        i = self.find_row(row_label)
+        name = self.find_column(column_label)
+        if i is None or name is None:
+            return None
+        return self.columns[name][i]
+
+
+# ============================
+# HTML → TABLE
+# ============================
+
+def _row_cells(tr):
+    values = []
+    for cell in tr.find_all(["th", "td"]):
+        text = cell.get_text(" ", strip=True)
+        span = cell.get("colspan")
+        span = int(span) if span and str(span).isdigit() else 1
+        values.extend([text] + [""] * (span - 1))
+    return values
+
+
+def _looks_like_header(cells, body):
+    if not cells or not any(cells):
+        return False
+    if any(parse_number(c) is not None for c in cells if c):
+        return False
+    # Có ít nhất 1 cột mà dòng dưới là số -> dòng đầu là tiêu đề
+    for j in range(len(cells)):
+        if any(j < len(r) and parse_number(r[j]) is not None for r in body):
+            return True
+    return False
+
+
+def _unique_header(cells, width):
+    header = []
+    seen = {}
+    for j in range(width):
+        name = cells[j] if j < len(cells) and cells[j] else f"Cột {j + 1}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name} ({seen[name]})"
+        else:
+            seen[name] = 1
+        header.append(name)
+    return header
+
+
+def table_from_element(table) -> Table:
+    trs = table.find_all("tr")
+    rows = [_row_cells(tr) for tr in trs]
+    keep = [i for i, r in enumerate(rows) if any(r)]
+    trs = [trs[i] for i in keep]
+    rows = [rows[i] for i in keep]
+    width = max((len(r) for r in rows), default=0)
+
+    header_cells = None
+    if rows and trs[0].find("th") is not None and trs[0].find("td") is None:
+        header_cells = rows.pop(0)
+    elif rows and _looks_like_header(rows[0], rows[1:]):
+        header_cells = rows.pop(0)
+
+    return Table(_unique_header(header_cells or [], width), rows)
+
+
+def parse_tables(html_list) -> list:
+    from bs4 import BeautifulSoup  # nạp lười, bs4 khá nặng
+
+    tables = []
+    for html in html_list:
+        soup = BeautifulSoup(html, "html.parser")
+        for element in soup.find_all("table"):
+            # Bỏ qua bảng lồng trong bảng khác, bảng ngoài đã chứa dữ liệu
+            if element.find_parent("table") is not None:
+                continue
+            table = table_from_element(element)
+            if table.header:
+                tables.append(table)
+    return tables
+
+
+# ============================
+# TRẢ LỜI CÂU HỎI TRÊN BẢNG
+# ============================
+
+# Từ khóa so trên lower_text (còn dấu); chỉ nhãn cột / nhãn dòng mới so
+# sau khi bỏ dấu
+_TABLE_REF_RE = re.compile(r"\bbảng\s*(?:số\s*)?(\d+)\b")
+
+_OPERATIONS = [
+    ("mean", ("trung bình", "average", "mean")),
+    ("max", ("lớn nhất", "cao nhất", "nhiều nhất", "max")),
+    ("min", ("nhỏ nhất", "thấp nhất", "ít nhất", "min")),
+    ("count", ("bao nhiêu dòng", "số dòng", "bao nhiêu mục", "count")),
+    ("sum", ("tổng", "cộng lại", "sum", "total")),
+]
+
+# "tổng quan", "tổng hợp"... không phải phép cộng -> bỏ trước khi nhận diện
+_NOT_OPERATION_RE = re.compile(r"\btổng (?:quan|hợp|kết|thể)\b")
+
+_OPERATION_NAMES = {
+    "sum": "Tổng",
+    "mean": "Trung bình",
+    "max": "Giá trị lớn nhất",
+    "min": "Giá trị nhỏ nhất",
+}
+
+
+def _label_score(question: str, label: str) -> int:
+    words = set(question.split())
+    return sum(len(w) for w in normalize_label(label).split() if w in words)
+
+
+def _best_column(table: Table, question: str, numeric_only: bool):
+    candidates = [
+        h for h in table.header
+        if not numeric_only or h in table.numeric
+    ]
+    scored = [(_label_score(question, h), h) for h in candidates]
+    scored = [s for s in scored if s[0] > 0]
+    if scored:
+        return max(scored, key=lambda s: s[0])[1]
+    return None
+
+
+def _best_row(table: Table, question: str):
+    scored = [
+        (_label_score(question, label), i)
+        for i, label in enumerate(table.row_labels)
+        if label
+    ]
+    scored = [s for s in scored if s[0] > 0]
+    return max(scored)[1] if scored else None
+
+
+def answer_table_question(question: str, tables: list):
+    # Trả về câu trả lời (str) nếu câu hỏi xử lý được trên bảng, ngược lại None
+    if not tables:
+        return None
+
+    q = lower_text(question)
+    ref = _TABLE_REF_RE.search(q)
+    if ref is None:
+        return None
+
+    index = int(ref.group(1))
+    if not 1 <= index <= len(tables):
+        return None
+    table = tables[index - 1]
+    q = (q[:ref.start()] + " " + q[ref.end():]).strip()
+
+    q_operation = _NOT_OPERATION_RE.sub(" ", q)
+    q = normalize_label(q)
+    operation = next(
+        (
+            op for op, words in _OPERATIONS
+            if any(re.search(rf"\b{w}\b", q_operation) for w in words)
+        ),
+        None,
+    )
+
+    if operation == "count":
+        n = len(table) - len(table.total_rows)
+        return f"Bảng {index} có {n} dòng dữ liệu."
+
+    if operation is not None:
+        # Chỉ tính khi câu hỏi nhắc tới 1 cột số; không rõ cột -> để LLM trả lời
+        name = _best_column(table, q, numeric_only=True)
+        if name is None:
+            return None
+        value = getattr(table, operation)(name)
+        return (
+            f"{_OPERATION_NAMES[operation]} cột \"{name}\" ở bảng {index}: "
+            f"**{format_number(value)}**"
+        )
+
+    # Tra cứu ô theo nhãn dòng + nhãn cột
+    row = _best_row(table, q)
+    name = _best_column(table, q, numeric_only=False)
+    if row is None or name is None or name == table.label_column:
+        return None
+    value = table.columns[name][row]
+    if name in table.numeric:
+        value = format_number(value)
+    return (
+        f"Bảng {index}, dòng \"{table.row_labels[row]}\", "
+        f"cột \"{name}\": **{value}**"
+    )
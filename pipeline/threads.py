@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# ============================
+# CHIA LUỒNG CPU CHO CÁC JOB OCR
+# ============================
+#
+# Thay vì cố định OMP_NUM_THREADS=1 cho mọi trường hợp, mỗi job chandra được
+# cấp số luồng theo số core và số job OCR đang chạy: 1 job chạy một mình
+# dùng hết máy, nhiều job song song thì chia đều.
+#
+# Chế độ benchmark đo thực tế trên máy và lưu cách chia tốt nhất:
+#   python -m pipeline.threads --benchmark sample.pdf
+
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+)
+THREAD_PROFILE_PATH = Path(
+    os.environ.get(
+        "OCR_THREAD_PROFILE",
+        Path(__file__).resolve().parent.parent / "thread_profile.json",
+    )
+)
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # macOS / Windows
+        return os.cpu_count() or 1
+
+
+def load_profile() -> dict:
+    # {"cores": 16, "threads": {"1": 16, "2": 8, "4": 4}}
+    try:
+        profile = json.loads(THREAD_PROFILE_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if profile.get("cores") != available_cores():
+        # Profile đo trên máy khác -> bỏ qua
+        return {}
+    return profile
+
+
+_profile = load_profile()
+
+
+def threads_for_job(active_jobs: int, cores: int = None) -> int:
+    cores = cores or available_cores()
+    active_jobs = max(1, active_jobs)
+
+    measured = _profile.get("threads", {})
+    if measured:
+        # Lấy số job đã đo gần nhất (không nhỏ hơn số job hiện tại)
+        known = sorted(int(k) for k in measured)
+        key = next((k for k in known if k >= active_jobs), known[-1])
+        return max(1, min(int(measured[str(key)]), cores // active_jobs or 1))
+
+    return max(1, cores // active_jobs)
+
+
+def thread_env(threads: int, base: dict = None) -> dict:
+    env = dict(os.environ if base is None else base)
+    for name in THREAD_ENV_VARS:
+        env[name] = str(threads)
+    env["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+    return env
+
+
+# ============================
+# BENCHMARK
+# ============================
+# pipeline.chandra / concurrent.futures chỉ cần khi chạy benchmark, không
+# nạp khi app import module này để chia luồng (chandra cũng import module này).
+
+def _run_once(input_file: Path, threads: int) -> float:
+    # Chạy chandra đúng như lúc OCR thật (CHANDRA_METHOD, timeout, dừng cả
+    # nhóm process khi lỗi), chỉ khác số luồng
+    from pipeline.chandra import run_chandra_cli
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        run_chandra_cli(input_file, Path(tmp), threads=threads)
+        return time.perf_counter() - start
+
+
+def _candidate_threads(cores: int, jobs: int) -> list:
+    limit = max(1, cores // jobs)
+    candidates = {limit}
+    t = 1
+    while t < limit:
+        candidates.add(t)
+        t *= 2
+    return sorted(candidates)
+
+
+def benchmark(input_file: Path, job_counts, cores: int) -> dict:
+    from concurrent.futures import ThreadPoolExecutor
+
+    best = {}
+    for jobs in job_counts:
+        results = []
+        for threads in _candidate_threads(cores, jobs):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                list(pool.map(lambda _: _run_once(input_file, threads), range(jobs)))
+            wall = time.perf_counter() - start
+            throughput = jobs / wall
+            results.append((throughput, threads))
+            print(
+                f"jobs={jobs:<3} threads/job={threads:<3} "
+                f"wall={wall:7.2f}s  docs/min={throughput * 60:6.2f}"
+            )
+        best[str(jobs)] = max(results)[1]
+        print(f"-> jobs={jobs}: {best[str(jobs)]} threads/job")
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đo cách chia luồng tốt nhất cho chandra")
+    parser.add_argument("--benchmark", type=Path, required=True, metavar="FILE",
+                        help="file PDF/ảnh mẫu dùng để đo")
+    parser.add_argument("--jobs", default="1,2,4",
+                        help="các số job song song cần đo, ví dụ 1,2,4")
+    parser.add_argument("--output", type=Path, default=THREAD_PROFILE_PATH)
+    args = parser.parse_args(argv)
+
+    cores = available_cores()
+    job_counts = [int(j) for j in args.jobs.split(",") if j.strip()]
+    print(f"cores={cores}")
+
+    profile = {
+        "cores": cores,
+        "threads": benchmark(args.benchmark, job_counts, cores),
+    }
+    args.output.write_text(json.dumps(profile, indent=2), encoding="utf-8")
+    print(f"Đã lưu {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+import cProfile
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import streamlit as st
+
+try:
+    from pyinstrument import Profiler as SamplingProfiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:  # Không có pyinstrument -> dùng cProfile
+    SamplingProfiler = None
+
+# ============================
+# PROFILE TỪNG LẦN RERUN (BẬT KHI CẦN)
+# ============================
+#
+# Bật cho mọi session bằng PROFILE_RERUNS=1, hoặc chỉ cho 1 người dùng bằng
+# cách thêm ?profile=1 vào URL. Mỗi lần rerun ghi 1 file vào PROFILE_DIR:
+#   - pyinstrument (nếu có): *.speedscope.json, mở bằng https://speedscope.app
+#   - cProfile: *.prof, xem bằng snakeviz / chuyển flamegraph bằng flameprof
+# Chỉ giữ PROFILE_KEEP file mới nhất.
+
+PROFILE_RERUNS = os.environ.get("PROFILE_RERUNS", "") == "1"
+PROFILE_DIR = Path(
+    os.environ.get(
+        "PROFILE_DIR",
+        Path(tempfile.gettempdir()) / "chatwithdocument_profiles",
+    )
+)
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "50"))
+
+# cProfile / pyinstrument chỉ chạy được 1 profiler 1 lúc -> rerun khác
+# (hoặc fragment lồng bên trong) trong lúc đang profile thì bỏ qua
+_active = threading.Lock()
+
+
+def profiling_enabled() -> bool:
+    if PROFILE_RERUNS:
+        return True
+    try:
+        return st.query_params.get("profile") == "1"
+    except Exception:
+        return False
+
+
+def _prune():
+    files = sorted(PROFILE_DIR.glob("*.*"), key=lambda p: p.stat().st_mtime)
+    for old in files[:-PROFILE_KEEP] if PROFILE_KEEP else files:
+        old.unlink(missing_ok=True)
+
+
+def _output_path(name: str, suffix: str) -> Path:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    now = time.time()
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"{now % 1:.3f}"[1:]
+    session = threading.current_thread().name.replace(" ", "_")
+    return PROFILE_DIR / f"{stamp}-{name}-{session}{suffix}"
+
+
+@contextmanager
+def profile_rerun(name: str):
+    # Dùng được như context manager hoặc decorator (cho fragment)
+    if not profiling_enabled() or not _active.acquire(blocking=False):
+        yield
+        return
+
+    try:
+        if SamplingProfiler is not None:
+            profiler = SamplingProfiler(interval=0.001)
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                _output_path(name, ".speedscope.json").write_text(
+                    profiler.output(SpeedscopeRenderer()), encoding="utf-8"
+                )
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                profiler.dump_stats(_output_path(name, ".prof"))
+    finally:
+        _active.release()
+        _prune()
@@ -0,0 +1,283 @@
+import asyncio
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Literal
+
+from fastapi import FastAPI, File, HTTPException, Query, UploadFile
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from pipeline import (
+    OcrQueueFull,
+    UploadTooLarge,
+    admission,
+    get_store,
+    open_document,
+    render_prometheus,
+    spool_upload,
+    stream_answer,
+    stream_corpus_answer,
+)
+
+# ============================
+# HTTP API: UPLOAD → OCR → HỎI ĐÁP
+# ============================
+#
+# Chạy độc lập với giao diện Streamlit:
+#   uvicorn server:app --host 0.0.0.0 --port 8000
+#
+# OCR và LLM chạy trên 2 pool thread riêng, chỉnh số worker bằng
+# OCR_WORKERS / LLM_WORKERS để mở rộng từng phần độc lập.
+#
+# Pool OCR có đủ thread cho mọi job đang chạy + đang chờ của admission, để
+# việc xếp hàng (ưu tiên, job ngắn trước, từ chối khi đầy) do
+# AdmissionController quyết định, không kẹt trong hàng đợi FIFO của pool.
+
+OCR_WORKERS = max(
+    int(os.environ.get("OCR_WORKERS", "2")),
+    admission.max_concurrent + admission.max_queue,
+)
+LLM_WORKERS = int(os.environ.get("LLM_WORKERS", "8"))
+UPLOAD_DIR = Path(
+    os.environ.get(
+        "UPLOAD_DIR",
+        Path(tempfile.gettempdir()) / "chatwithdocument_uploads",
+    )
+)
+# Phải khớp với admission.PRIORITY_WEIGHTS; FastAPI trả 422 nếu sai
+Priority = Literal["interactive", "batch"]
+# Số job giữ trạng thái trong RAM; job cũ đã xong bị bỏ, tra lại từ SQLite
+MAX_JOBS = int(os.environ.get("SERVER_MAX_JOBS", "1000"))
+
+app = FastAPI(title="OCR + Chat LLM")
+
+ocr_pool = ThreadPoolExecutor(max_workers=OCR_WORKERS, thread_name_prefix="ocr")
+llm_pool = ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="llm")
+
+# document_id -> trạng thái job. Không giữ DocumentHandle lâu dài: mỗi
+# request mở rồi nhả, để cache chung còn loại được tài liệu không dùng.
+jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+# Job đã gửi vào pool OCR nhưng chưa xong (kể cả chưa tới admission.slot)
+_ocr_inflight = 0
+
+
+class Question(BaseModel):
+    question: str
+
+
+# ============================
+# OCR WORKER
+# ============================
+
+def _doc_summary(data: dict) -> dict:
+    return {
+        "name": data["name"],
+        "pages": len(data["pages"]),
+        "tables": len(data["tables"]),
+        "images": len(data["images"]),
+    }
+
+
+def _remember_job(doc_id: str, job: dict):
+    with _jobs_lock:
+        jobs[doc_id] = job
+        jobs.move_to_end(doc_id)
+        for old_id in list(jobs):
+            if len(jobs) <= MAX_JOBS:
+                break
+            if jobs[old_id]["status"] not in ("queued", "running"):
+                del jobs[old_id]
+
+
+def _ocr_job(doc_id: str, path: Path, name: str, priority: Priority | None = None):
+    global _ocr_inflight
+    job = jobs[doc_id]
+
+    def on_wait(position):
+        job["status"] = "queued" if position else "running"
+        job["queue_position"] = position
+
+    def on_progress(done, total):
+        job["pages_done"] = done
+        job["pages_total"] = total
+
+    try:
+        job["status"] = "running"
+        handle = open_document(
+            path, name, on_wait=on_wait, key=doc_id, on_progress=on_progress,
+            priority=priority,
+        )
+        try:
+            job.update(_doc_summary(handle.data))
+        finally:
+            handle.release()
+        job["status"] = "done"
+    except OcrQueueFull as e:
+        job["status"] = "rejected"
+        job["error"] = str(e)
+    except Exception as e:
+        job["status"] = "error"
+        job["error"] = str(e)
+    finally:
+        job["queue_position"] = 0
+        path.unlink(missing_ok=True)
+        with _jobs_lock:
+            _ocr_inflight -= 1
+
+
+def _spool_upload(upload: UploadFile):
+    # Ghi file upload ra đĩa theo từng khối, tính hash trong lúc ghi
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=UPLOAD_DIR, suffix=Path(upload.filename or "").suffix)
+    os.close(fd)
+    # upload.size có sẵn thì từ chối ngay, không thì dừng khi chép quá giới hạn
+    return Path(tmp), spool_upload(upload.file, Path(tmp), size=upload.size)
+
+
+def _open_stored(doc_id: str):
+    # Chỉ mở tài liệu đã có trong SQLite; id lạ -> None (không OCR bytes rỗng)
+    if not get_store().has_document(doc_id):
+        return None
+    return open_document(b"", key=doc_id)
+
+
+def _job_for(doc_id: str):
+    job = jobs.get(doc_id)
+    if job is None:
+        # Đã OCR ở lần chạy trước -> nạp lại từ SQLite, không OCR lại
+        handle = _open_stored(doc_id)
+        if handle is None:
+            return None
+        try:
+            job = {"status": "done", "queue_position": 0, "error": None,
+                   **_doc_summary(handle.data)}
+        finally:
+            handle.release()
+        _remember_job(doc_id, job)
+    return job
+
+
+def _answer_stream(handle, question: str):
+    # Giữ handle suốt lúc stream câu trả lời, xong (hoặc client ngắt) thì nhả
+    try:
+        yield from stream_answer(handle.data, question)
+    finally:
+        handle.release()
+
+
+# ============================
+# ENDPOINTS
+# ============================
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "ocr": admission.stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Prometheus scrape: histogram thời gian từng giai đoạn + hàng đợi / cache
+    return PlainTextResponse(
+        render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/search")
+async def search(q: str, limit: int = Query(20, ge=1, le=100)):
+    # Tìm từ khóa trên mọi tài liệu đã OCR (FTS5)
+    return await asyncio.to_thread(get_store().search, q, limit)
+
+
+@app.post("/documents", status_code=202)
+async def upload_document(file: UploadFile = File(...), priority: Priority | None = None):
+    global _ocr_inflight
+    # priority: "interactive" / "batch"; bỏ trống -> theo số trang
+    if _ocr_inflight >= admission.max_concurrent + admission.max_queue:
+        raise HTTPException(503, "Hàng đợi OCR đã đầy, vui lòng thử lại sau")
+
+    try:
+        path, doc_id = await asyncio.to_thread(_spool_upload, file)
+    except UploadTooLarge as e:
+        raise HTTPException(413, str(e))
+
+    job = jobs.get(doc_id)
+    if job is not None and job["status"] in ("queued", "running", "done"):
+        path.unlink(missing_ok=True)
+        return {"document_id": doc_id, "status": job["status"]}
+
+    with _jobs_lock:
+        if _ocr_inflight >= admission.max_concurrent + admission.max_queue:
+            path.unlink(missing_ok=True)
+            raise HTTPException(503, "Hàng đợi OCR đã đầy, vui lòng thử lại sau")
+        _ocr_inflight += 1
+    _remember_job(doc_id, {
+        "status": "queued",
+        "name": file.filename,
+        "queue_position": 0,
+        "error": None,
+    })
+    ocr_pool.submit(_ocr_job, doc_id, path, file.filename or path.name, priority)
+    return {"document_id": doc_id, "status": "queued"}
+
+
+@app.get("/documents/{doc_id}")
+async def document_status(doc_id: str):
+    job = await asyncio.to_thread(_job_for, doc_id)
+    if job is None:
+        raise HTTPException(404, "Không tìm thấy tài liệu")
+
+    return {"document_id": doc_id, **job}
+
+
+async def _iterate_in(executor, iterator):
+    # Chạy generator đồng bộ (requests stream) trên pool LLM, trả về async
+    loop = asyncio.get_running_loop()
+    done = object()
+    while True:
+        chunk = await loop.run_in_executor(executor, next, iterator, done)
+        if chunk is done:
+            break
+        yield chunk
+
+
+@app.post("/documents/{doc_id}/questions")
+async def ask_question(doc_id: str, body: Question):
+    job = await asyncio.to_thread(_job_for, doc_id)
+    if job is None:
+        raise HTTPException(404, "Không tìm thấy tài liệu")
+    if job["status"] != "done":
+        raise HTTPException(409, f"Tài liệu chưa OCR xong (trạng thái: {job['status']})")
+    if not body.question.strip():
+        raise HTTPException(422, "Câu hỏi trống")
+    # Mở trước khi trả response: tài liệu đã bị xóa khỏi SQLite -> 404
+    handle = await asyncio.to_thread(_open_stored, doc_id)
+    if handle is None:
+        raise HTTPException(404, "Không tìm thấy tài liệu")
+
+    return StreamingResponse(
+        _iterate_in(llm_pool, _answer_stream(handle, body.question)),
+        media_type="text/plain; charset=utf-8",
+    )
+
+
+@app.post("/questions")
+async def ask_corpus(body: Question):
+    # Hỏi trên toàn bộ kho tài liệu đã OCR
+    if not body.question.strip():
+        raise HTTPException(422, "Câu hỏi trống")
+
+    return StreamingResponse(
+        _iterate_in(llm_pool, stream_corpus_answer(body.question)),
+        media_type="text/plain; charset=utf-8",
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", "8000")))
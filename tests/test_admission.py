@@ -0,0 +1,180 @@
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from pipeline import config, core
+from pipeline.admission import AdmissionController, OcrQueueFull
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("hết thời gian chờ")
+        time.sleep(0.01)
+
+
+# ----- run_ocr: chia trang theo slot -----
+
+@pytest.fixture
+def fake_ocr(monkeypatch):
+    # chandra giả: ghi lại (file, page_range); admission riêng 1 slot
+    controller = AdmissionController(max_concurrent=1, max_queue=8)
+    pages = {}
+    calls = []
+    hooks = {}
+
+    def estimate(path):
+        n = pages[Path(path).stem]
+        return {"pages": n, "megapixels": 2.0 * n, "exact": True}
+
+    def run_chandra_cli(input_file, output_dir, threads=None, on_progress=None,
+                        page_range=None, expected_pages=None):
+        calls.append((Path(input_file).stem, page_range))
+        hook = hooks.pop((Path(input_file).stem, page_range), None)
+        if hook is not None:
+            hook()
+
+    monkeypatch.setattr(core, "admission", controller)
+    monkeypatch.setattr(core, "estimate_ocr_job", estimate)
+    monkeypatch.setattr(core, "run_chandra_cli", run_chandra_cli)
+    monkeypatch.setattr(config, "OCR_SLICE_PAGES", 2)
+    return controller, pages, calls, hooks
+
+
+def run(tmp_path, name):
+    source = tmp_path / f"{name}.pdf"
+    source.write_bytes(b"%PDF")
+    core.run_ocr(source, tmp_path / f"{name}_out")
+
+
+def test_short_job_overtakes_long_job_started_alone(tmp_path, fake_ocr):
+    controller, pages, calls, hooks = fake_ocr
+    pages.update(long=10, short=1)
+    short = threading.Thread(target=run, args=(tmp_path, "short"))
+
+    def short_arrives():
+        # Job dài đã bắt đầu (không ai chờ); job 1 trang đến giữa phần đầu
+        short.start()
+        wait_until(lambda: controller.stats()["waiting"] == 1)
+
+    hooks[("long", "1-2")] = short_arrives
+    run(tmp_path, "long")
+    short.join(5)
+
+    assert calls[:2] == [("long", "1-2"), ("short", None)]
+    assert [r for name, r in calls if name == "long"] == [
+        "1-2", "3-4", "5-6", "7-8", "9-10",
+    ]
+
+
+def test_long_job_alone_runs_all_slices_in_one_slot(tmp_path, fake_ocr):
+    controller, pages, calls, _ = fake_ocr
+    pages.update(long=5)
+    run(tmp_path, "long")
+    assert calls == [("long", "1-2"), ("long", "3-4"), ("long", "5-5")]
+    assert controller.stats()["admitted"] == 1
+
+
+def test_zero_pages_falls_back_to_single_run(tmp_path, fake_ocr):
+    _, pages, calls, _ = fake_ocr
+    pages.update(empty=0)
+    run(tmp_path, "empty")
+    assert calls == [("empty", None)]
+
+
+# ----- AdmissionController: thứ tự chờ -----
+
+def admit_order(controller, jobs):
+    # Giữ slot duy nhất, xếp lần lượt các job (tên, cost, priority, since)
+    # vào hàng rồi nhả -> trả về thứ tự được chạy
+    order = []
+
+    def wait(name, cost, priority, since):
+        with controller.slot(cost=cost, priority=priority, since=since):
+            order.append(name)
+
+    threads = []
+    with controller.slot():
+        for i, job in enumerate(jobs, 1):
+            thread = threading.Thread(target=wait, args=job)
+            thread.start()
+            threads.append(thread)
+            wait_until(lambda i=i: controller.stats()["waiting"] == i)
+    for thread in threads:
+        thread.join(5)
+    return order
+
+
+def test_shortest_job_first():
+    controller = AdmissionController(max_concurrent=1, aging_seconds=0)
+    order = admit_order(controller, [
+        ("lớn", 50.0, "interactive", None),
+        ("vừa", 10.0, "interactive", None),
+        ("nhỏ", 1.0, "interactive", None),
+    ])
+    assert order == ["nhỏ", "vừa", "lớn"]
+
+
+def test_same_cost_keeps_arrival_order():
+    controller = AdmissionController(max_concurrent=1, aging_seconds=0)
+    order = admit_order(controller, [
+        ("a", 5.0, "interactive", None),
+        ("b", 5.0, "interactive", None),
+        ("c", 5.0, "interactive", None),
+    ])
+    assert order == ["a", "b", "c"]
+
+
+def test_priority_weight_overrides_cost():
+    # batch x4: 3 megapixel batch (12) xếp sau 10 megapixel interactive
+    controller = AdmissionController(max_concurrent=1, aging_seconds=0)
+    order = admit_order(controller, [
+        ("batch", 3.0, "batch", None),
+        ("interactive", 10.0, "interactive", None),
+    ])
+    assert order == ["interactive", "batch"]
+
+
+def test_aging_promotes_long_waiting_job():
+    # Đã chờ 100s với aging 1s/megapixel -> job 50 megapixel lên trước job 1
+    controller = AdmissionController(max_concurrent=1, aging_seconds=1)
+    order = admit_order(controller, [
+        ("nhỏ", 1.0, "interactive", None),
+        ("lớn", 50.0, "interactive", time.monotonic() - 100),
+    ])
+    assert order == ["lớn", "nhỏ"]
+
+
+def test_queue_full_rejects_new_jobs_but_not_requeued_slices():
+    controller = AdmissionController(max_concurrent=1, max_queue=1)
+    released = threading.Event()
+
+    def waiter():
+        with controller.slot():
+            pass
+
+    with controller.slot():
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        wait_until(lambda: controller.stats()["waiting"] == 1)
+
+        with pytest.raises(OcrQueueFull), controller.slot():
+            pass
+        assert controller.stats()["rejected"] == 1
+
+        # Phần tiếp theo của job đang chạy dở (có since) vẫn được xếp hàng
+        def requeued():
+            with controller.slot(since=time.monotonic()):
+                released.set()
+
+        second = threading.Thread(target=requeued)
+        second.start()
+        wait_until(lambda: controller.stats()["waiting"] == 2)
+
+    thread.join(5)
+    second.join(5)
+    assert released.is_set()
+    assert controller.stats()["rejected"] == 1
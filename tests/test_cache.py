@@ -0,0 +1,81 @@
+import gc
+import threading
+
+from pipeline.cache import DocumentRegistry
+
+
+def doc(text="nội dung"):
+    return {"pages": [text], "bytes": len(text)}
+
+
+def open_doc(registry, key="a"):
+    return registry.open(key, doc)
+
+
+def test_release_waits_for_lock_held_by_another_thread():
+    registry = DocumentRegistry(max_bytes=0)
+    handle = open_doc(registry)
+    released = threading.Event()
+
+    def release():
+        handle.release()
+        released.set()
+
+    with registry._lock:
+        worker = threading.Thread(target=release)
+        worker.start()
+        # Thread kia đang chờ khóa, chưa nhả được
+        assert not released.wait(0.2)
+    worker.join(5)
+
+    assert released.is_set()
+    stats = registry.stats()
+    assert stats["sessions"] == 0
+    assert stats["documents"] == 0
+    assert stats["evictions"] == 1
+
+
+def test_gc_of_unreleased_handle_while_lock_is_held():
+    # GC chạy finalizer ngay trên thread đang giữ _lock -> không được treo
+    registry = DocumentRegistry(max_bytes=0)
+    collected = threading.Event()
+
+    def collect_under_lock():
+        handle = open_doc(registry)
+        cycle = {"handle": handle}
+        cycle["self"] = cycle
+        del handle, cycle
+        with registry._lock:
+            gc.collect()
+            # Chưa lấy được khóa -> key nằm chờ trong hàng
+            assert list(registry._released) == ["a"]
+        collected.set()
+
+    gc.disable()
+    try:
+        worker = threading.Thread(target=collect_under_lock, daemon=True)
+        worker.start()
+        worker.join(5)
+    finally:
+        gc.enable()
+
+    assert collected.is_set(), "finalizer bị treo khi thread đang giữ khóa"
+    stats = registry.stats()
+    assert stats["sessions"] == 0
+    assert stats["documents"] == 0
+    assert stats["evictions"] == 1
+
+
+def test_gc_after_explicit_release_does_not_release_twice():
+    registry = DocumentRegistry(max_bytes=0)
+    first = open_doc(registry)
+    second = open_doc(registry)
+    first.release()
+    del first
+    gc.collect()
+
+    stats = registry.stats()
+    assert stats["sessions"] == 1
+    assert stats["documents"] == 1
+    second.release()
+    assert registry.stats()["documents"] == 0
@@ -0,0 +1,13 @@
+import pipeline
+
+
+def test_all_matches_lazy_exports():
+    eager = {"OcrQueueFull", "admission", "DocumentHandle", "registry"}
+    assert len(pipeline.__all__) == len(set(pipeline.__all__))
+    assert set(pipeline.__all__) == eager | set(pipeline._EXPORTS)
+    assert set(pipeline.__all__) <= set(dir(pipeline))
+
+
+def test_lazy_exports_resolve():
+    for name in pipeline._EXPORTS:
+        assert getattr(pipeline, name) is not None
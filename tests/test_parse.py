@@ -0,0 +1,44 @@
+from pipeline.parse import read_ocr_blocks, scan_ocr_output
+
+
+def write(path, text=""):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def names(manifest, root):
+    return [e["path"].relative_to(root).as_posix() for e in manifest]
+
+
+def test_manifest_orders_by_page_number(tmp_path):
+    for page in (10, 2, 1, 11):
+        write(tmp_path / "doc" / f"doc_page_{page}.md", f"trang {page}")
+    write(tmp_path / "doc" / "doc.json")
+    write(tmp_path / "doc" / "metadata.md", "cuối")
+
+    manifest = scan_ocr_output(tmp_path)
+    assert names(manifest, tmp_path) == [
+        "doc/doc_page_1.md",
+        "doc/doc_page_2.md",
+        "doc/doc_page_10.md",
+        "doc/doc_page_11.md",
+        "doc/metadata.md",
+    ]
+    assert set(manifest[0]) == {"path", "kind"}
+
+    text_blocks, _ = read_ocr_blocks(tmp_path, manifest)
+    assert text_blocks[:4] == ["trang 1", "trang 2", "trang 10", "trang 11"]
+
+
+def test_manifest_keeps_slice_directories_in_order(tmp_path):
+    # Mỗi phần OCR (part_00001, part_00003) đánh số trang lại từ đầu
+    write(tmp_path / "part_00003" / "doc" / "doc_page_0.md", "trang 3")
+    write(tmp_path / "part_00001" / "doc" / "doc_page_1.md", "trang 2")
+    write(tmp_path / "part_00001" / "doc" / "doc_page_0.md", "trang 1")
+
+    text_blocks, _ = read_ocr_blocks(tmp_path, scan_ocr_output(tmp_path))
+    assert text_blocks == ["trang 1", "trang 2", "trang 3"]
+
+
+def test_missing_output_dir_is_empty(tmp_path):
+    assert scan_ocr_output(tmp_path / "khong-co") == []
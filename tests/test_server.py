@@ -0,0 +1,58 @@
+import asyncio
+from typing import get_args
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from pipeline.admission import PRIORITY_WEIGHTS
+
+
+class FakeStore:
+    def __init__(self, keys=()):
+        self.keys = set(keys)
+
+    def has_document(self, key):
+        return key in self.keys
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    # open_document giả: ghi lại key, không OCR
+    calls = []
+
+    def open_document(source, name="input", key=None, **kwargs):
+        calls.append(key)
+        raise AssertionError("không được mở tài liệu lạ")
+
+    monkeypatch.setattr(server, "get_store", lambda: FakeStore())
+    monkeypatch.setattr(server, "open_document", open_document)
+    monkeypatch.setattr(server, "jobs", server.OrderedDict())
+    return calls
+
+
+def test_unknown_document_status_is_404(opened):
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(server.document_status("khong-co"))
+    assert e.value.status_code == 404
+    assert opened == []
+
+
+def test_question_on_unknown_document_is_404(opened):
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(server.ask_question("khong-co", server.Question(question="Tổng?")))
+    assert e.value.status_code == 404
+    assert opened == []
+
+
+def test_question_on_document_dropped_from_store_is_404(opened):
+    # Job còn trong RAM nhưng tài liệu đã bị xóa khỏi SQLite
+    server.jobs["da-xoa"] = {"status": "done", "queue_position": 0, "error": None}
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(server.ask_question("da-xoa", server.Question(question="Tổng?")))
+    assert e.value.status_code == 404
+    assert opened == []
+
+
+def test_priority_choices_match_admission():
+    assert set(get_args(server.Priority)) == set(PRIORITY_WEIGHTS)
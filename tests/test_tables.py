@@ -0,0 +1,121 @@
+import math
+
+import pytest
+
+from pipeline.tables import Table, answer_table_question, parse_number, parse_tables
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1.234.567", 1234567),
+    ("1,234,567", 1234567),
+    ("1.234", 1234),
+    ("1,234", 1234),
+    ("1.234,5", 1234.5),
+    ("1,234.5", 1234.5),
+    ("12,5", 12.5),
+    ("0.75", 0.75),
+    ("1 200 000", 1200000),
+    ("(1.500)", -1500),
+    ("-42", -42),
+    ("250.000 đ", 250000),
+    ("1.000.000 VNĐ", 1000000),
+    ("15%", 15),
+    ("$3,200", 3200),
+    ("0,001", 0.001),
+    ("0.001", 0.001),
+    ("-0,250", -0.25),
+])
+def test_parse_number(text, expected):
+    assert parse_number(text) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("text", ["", "   ", "abc", "Tổng cộng", "12a", "-", "1-2"])
+def test_parse_number_rejects_text(text):
+    assert parse_number(text) is None
+
+
+def invoice():
+    return Table(
+        ["STT", "Mặt hàng", "Số lượng", "Đơn giá", "Thành tiền"],
+        [
+            ["1", "Bút bi", "10", "5.000", "50.000"],
+            ["2", "Vở", "4", "12.000", "48.000"],
+            ["3", "Thước kẻ", "2", "", "14.000"],
+            ["", "Tổng cộng", "", "", "112.000"],
+        ],
+    )
+
+
+def test_table_columns_and_totals():
+    table = invoice()
+    assert table.numeric == {"STT", "Số lượng", "Đơn giá", "Thành tiền"}
+    assert table.label_column == "Mặt hàng"
+    assert table.total_rows == {3}
+    assert table.sum("thanh tien") == 112000
+    assert table.values("Thành tiền", include_totals=True)[-1] == 112000
+    assert math.isnan(table.columns["Đơn giá"][2])
+    assert table.lookup("vở", "đơn giá") == 12000
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("Tổng thành tiền ở bảng 1?", 'Tổng cột "Thành tiền" ở bảng 1: **112.000**'),
+    ("Tổng tiền bảng số 1 là bao nhiêu", 'Tổng cột "Thành tiền" ở bảng 1: **112.000**'),
+    ("Đơn giá trung bình trong bảng 1", 'Trung bình cột "Đơn giá" ở bảng 1: **8.500**'),
+    ("Số lượng lớn nhất ở bảng 1", 'Giá trị lớn nhất cột "Số lượng" ở bảng 1: **10**'),
+    ("Bảng 1 có bao nhiêu dòng?", "Bảng 1 có 3 dòng dữ liệu."),
+    ("Đơn giá của vở trong bảng 1", 'Bảng 1, dòng "Vở", cột "Đơn giá": **12.000**'),
+])
+def test_answer_table_question(question, expected):
+    assert answer_table_question(question, [invoice()]) == expected
+
+
+@pytest.mark.parametrize("question", [
+    # Không nhắc bảng / số bảng không tồn tại
+    "Tổng thành tiền là bao nhiêu?",
+    "Tổng thành tiền ở bảng 2?",
+    # "tổng quan", "tổng hợp"... không phải phép cộng
+    "Bảng 1 nói về tổng quan gì?",
+    "Tổng hợp nội dung bảng 1",
+    "Tổng kết bảng 1 giúp tôi",
+    # Phép tính nhưng không nói cột nào -> để LLM trả lời
+    "Tính tổng bảng 1",
+    # "bằng 1" không phải "bảng 1"
+    "Tổng thành tiền có bằng 1 triệu không?",
+])
+def test_answer_table_question_falls_back_to_llm(question):
+    assert answer_table_question(question, [invoice()]) is None
+
+
+def test_question_keywords_keep_diacritics():
+    # "số đồng" không phải "số dòng"
+    answer = answer_table_question("Tổng số đồng ở bảng 1 là bao nhiêu?", [invoice()])
+    assert answer is None or "dòng dữ liệu" not in answer
+
+
+def test_total_row_words_keep_diacritics():
+    table = Table(
+        ["Hạng mục", "Chi phí"],
+        [
+            ["Vật tư", "100"],
+            ["Công", "40"],
+            ["Công lắp đặt", "60"],
+            ["Cộng", "200"],
+        ],
+    )
+    assert table.total_rows == {3}
+    assert table.sum("chi phí") == 200
+
+
+def test_parse_tables_html():
+    html = (
+        "<table><tr><th>Quý</th><th>Doanh thu</th></tr>"
+        "<tr><td>Q1</td><td>1.200</td></tr>"
+        "<tr><td>Q2</td><td>1.800</td></tr></table>"
+        "<table><tr><td>Năm</td><td>Lợi nhuận</td></tr>"
+        "<tr><td>2023</td><td>(300)</td></tr></table>"
+    )
+    first, second = parse_tables([html])
+    assert first.header == ["Quý", "Doanh thu"]
+    assert first.sum("doanh thu") == 3000
+    assert second.header == ["Năm", "Lợi nhuận"]
+    assert second.values("Lợi nhuận") == [-300]